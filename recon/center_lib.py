@@ -0,0 +1,292 @@
+"""
+Rotation axis search: reconstruction of the same sinogram with a range of centers.
+"""
+
+import os
+import json
+
+import numpy as np
+import tomopy
+
+
+def pad_sinogram(sino):
+    """
+    Pad a sinogram to 3N/2 columns by replicating its edge values.
+
+    Parameters
+    ----------
+    sino : ndarray
+        Sinogram(s), the last axis is the detector column.
+
+    Returns
+    -------
+    ndarray
+        Padded float32 sinogram(s); the data starts at column N//4.
+    """
+
+    N = sino.shape[-1]
+    width = [(0, 0)] * (sino.ndim - 1) + [(N//4, 3*N//2 - N - N//4)]
+
+    return np.pad(np.asarray(sino, dtype=np.float32), width, mode='edge')
+
+
+def sweep(data, theta, centers, algorithm='gridrec', filter_name='parzen', ncore=None, circ_mask=True):
+    """
+    Reconstruct one sinogram with a range of rotation axis locations.
+
+    The sinogram is converted to float32 and padded once. It is then reconstructed
+    in batches of ncore centers, so at most ncore copies of the padded sinogram exist
+    at any time instead of one copy per center.
+
+    Parameters
+    ----------
+    data : ndarray
+        Preprocessed (-log) sinogram of shape (nproj, ncol) or (nproj, 1, ncol).
+    theta : ndarray
+        Projection angles in radians.
+    centers : ndarray
+        Rotation axis locations (pixel) to reconstruct.
+    algorithm, filter_name : str
+        tomopy.recon algorithm and filter.
+    ncore : int
+        Number of cores, also the number of centers reconstructed by each tomopy.recon call.
+    circ_mask : bool
+        Mask each reconstructed slice with a circle.
+
+    Returns
+    -------
+    ndarray
+        float32 reconstructions of shape (n_centers, N, N).
+    """
+
+    sino = pad_sinogram(np.reshape(data, (data.shape[0], data.shape[-1])))
+    N = data.shape[-1]
+    centers = np.asarray(centers, dtype=np.float32)
+    ncore = ncore or os.cpu_count() or 1
+
+    rec = np.empty((len(centers), N, N), dtype=np.float32)
+    for start in range(0, len(centers), ncore):
+        batch = centers[start:start + ncore]
+        stack = np.ascontiguousarray(np.broadcast_to(sino, (len(batch),) + sino.shape))
+        batch_rec = tomopy.recon(stack, theta, center=batch + N//4, sinogram_order=True, algorithm=algorithm, filter_name=filter_name, ncore=ncore, nchunk=1)
+        rec[start:start + len(batch)] = batch_rec[:, N//4:5*N//4, N//4:5*N//4]
+        del stack, batch_rec
+
+    if circ_mask:
+        rec = tomopy.circ_mask(rec, axis=0, ratio=0.95)
+
+    return rec
+
+
+def _circle(N, ratio=0.95):
+    y, x = np.ogrid[:N, :N]
+    r = (N - 1) / 2.0
+    return (x - r) ** 2 + (y - r) ** 2 < (ratio * N / 2.0) ** 2
+
+
+def entropy(rec, nbins=256):
+    """
+    Histogram entropy of each slice inside the reconstruction circle (lower is better).
+
+    All slices share the same histogram range so that their scores can be compared.
+    """
+
+    values = rec[:, _circle(rec.shape[-1])]
+    lo, hi = np.percentile(values, (0.5, 99.5))
+    if hi <= lo:
+        return np.zeros(len(rec))
+
+    score = np.empty(len(rec))
+    for i, v in enumerate(values):
+        hist = np.histogram(v, bins=nbins, range=(lo, hi))[0].astype(np.float64)
+        p = hist[hist > 0] / hist.sum()
+        score[i] = -np.sum(p * np.log2(p))
+
+    return score
+
+
+METRICS = {'entropy': entropy}
+
+
+def bin_columns(data, level):
+    """
+    Average groups of 2**level detector columns.
+    """
+
+    f = 2 ** level
+    ncol = data.shape[-1] // f * f
+    shape = data.shape[:-1] + (ncol // f, f)
+
+    return data[..., :ncol].reshape(shape).mean(axis=-1, dtype=np.float32)
+
+
+def _best(centers, score):
+    # parabola through the minimum and its neighbours for a sub-step estimate
+    i = int(np.argmin(score))
+    if 0 < i < len(score) - 1:
+        denom = score[i-1] - 2 * score[i] + score[i+1]
+        if denom > 0:
+            step = centers[i+1] - centers[i]
+            return float(centers[i] + 0.5 * step * (score[i-1] - score[i+1]) / denom)
+    return float(centers[i])
+
+
+def auto_center(data, theta, center=None, width=None, level=2, step=0.25, metric='entropy', algorithm='gridrec', filter_name='parzen'):
+    """
+    Coarse to fine rotation axis search scored by an image quality metric.
+
+    The sinogram binned by 2**level is first reconstructed every binned pixel over
+    center +/- width; the full resolution sinogram is then reconstructed in steps of
+    step pixels over +/- 2**level pixels around the best coarse center.
+
+    Parameters
+    ----------
+    data : ndarray
+        Preprocessed (-log) sinogram of shape (nproj, ncol) or (nproj, 1, ncol).
+    theta : ndarray
+        Projection angles in radians.
+    center : float
+        Initial guess (pixel), default the detector center.
+    width : float
+        Coarse search half width (pixel), default 1/8 of the detector width.
+    level : int
+        Binning of the coarse search as power(2, level).
+    step : float
+        Step of the fine search (pixel).
+    metric : str
+        Image quality metric, a key of METRICS.
+
+    Returns
+    -------
+    center : float
+        Rotation axis location (pixel).
+    curves : dict
+        Metric name and the centers and scores of the coarse and fine searches.
+    """
+
+    score = METRICS[metric]
+    ncol = data.shape[-1]
+    sino = np.reshape(data, (data.shape[0], ncol)).astype(np.float32)
+    if center is None:
+        center = ncol / 2.0
+    if width is None:
+        width = ncol / 8.0
+
+    # coarse search on the binned sinogram, binned pixel j is centered on full pixel j*f + (f-1)/2
+    f = 2 ** level
+    coarse_sino = bin_columns(sino, level)
+    coarse_centers = np.arange(np.floor((center - width - (f-1) / 2.0) / f), np.ceil((center + width - (f-1) / 2.0) / f) + 1)
+    coarse_score = score(sweep(coarse_sino, theta, coarse_centers, algorithm=algorithm, filter_name=filter_name))
+    coarse_center = coarse_centers[int(np.argmin(coarse_score))] * f + (f-1) / 2.0
+
+    # fine search at full resolution around the best coarse center
+    fine_centers = np.arange(coarse_center - f, coarse_center + f + step / 2.0, step)
+    fine_score = score(sweep(sino, theta, fine_centers, algorithm=algorithm, filter_name=filter_name))
+    rot_center = _best(fine_centers, fine_score)
+
+    curves = {'metric': metric,
+              'coarse': {'center': (coarse_centers * f + (f-1) / 2.0).tolist(), 'score': coarse_score.tolist()},
+              'fine': {'center': fine_centers.tolist(), 'score': fine_score.tolist()}}
+
+    return rot_center, curves
+
+
+def fit_tilt(rows, centers):
+    """
+    Fit a tilted rotation axis center(row) = intercept + slope * row.
+
+    Centers more than 3 robust standard deviations (at least 1 pixel) away from a
+    median of pairwise slopes (Theil-Sen) fit, e.g. sinograms above or below the
+    sample, are dropped before the final least squares fit.
+
+    Returns
+    -------
+    intercept, slope : float
+        Center at row 0 (pixel) and change of the center per detector row.
+    """
+
+    rows = np.asarray(rows, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    i, j = np.triu_indices(len(rows), 1)
+    pairs = rows[j] != rows[i]
+    slope = np.median((centers[j] - centers[i])[pairs] / (rows[j] - rows[i])[pairs])
+    intercept = np.median(centers - slope * rows)
+
+    residual = np.abs(centers - (intercept + slope * rows))
+    sigma = 1.4826 * np.median(residual)
+    keep = residual <= max(3 * sigma, 1.0)
+    if keep.sum() >= 2:
+        slope, intercept = np.polyfit(rows[keep], centers[keep], 1)
+
+    return float(intercept), float(slope)
+
+
+class CenterCache(object):
+    """
+    rotation_axis.json of a folder and its rotation_axis_info.json sidecar.
+
+    Both files are rewritten after every update so that an interrupted run keeps
+    the centers found so far. A file is cached when its size, mtime and the search
+    parameters match the ones stored in rotation_axis_info.json; its center is then
+    the one in rotation_axis.json, including any manual correction.
+
+    Parameters
+    ----------
+    top : str
+        Folder containing the data sets.
+    names : list
+        Data set file names, in rotation_axis.json order.
+    """
+
+    def __init__(self, top, names):
+        self.jfname = os.path.join(top, 'rotation_axis.json')
+        self.ifname = os.path.join(top, 'rotation_axis_info.json')
+        self.top = top
+        self.names = list(names)
+
+        self.centers = {}
+        for case in self._load(self.jfname).values():
+            self.centers.update(case)
+        self.info = self._load(self.ifname)
+
+    @staticmethod
+    def _load(fname):
+        try:
+            with open(fname) as json_file:
+                return json.load(json_file)
+        except (IOError, ValueError):
+            return {}
+
+    @staticmethod
+    def _dump(fname, dictionary):
+        # write a temporary file first, a crash never leaves a truncated json
+        tmp = fname + '.tmp'
+        with open(tmp, 'w') as json_file:
+            json.dump(dictionary, json_file)
+        os.replace(tmp, fname)
+
+    def key(self, name, **params):
+        """
+        Cache key of a data set: file size and mtime plus the search parameters.
+        """
+        st = os.stat(os.path.join(self.top, name))
+        return dict(params, size=st.st_size, mtime=st.st_mtime)
+
+    def cached(self, name, key):
+        info = self.info.get(name, {})
+        return name in self.centers and all(info.get(k) == v for k, v in key.items())
+
+    def update(self, name, rot_center, info):
+        self.centers[name] = rot_center
+        self.info[name] = dict(info, center=rot_center)
+        self.save()
+
+    def save(self):
+        dic_centers = {}
+        i = 0
+        for name in self.names:
+            if name in self.centers:
+                dic_centers[i] = {name: self.centers[name]}
+                i += 1
+        self._dump(self.jfname, dic_centers)
+        self._dump(self.ifname, dict((name, self.info[name]) for name in self.names if name in self.info))
@@ -0,0 +1,177 @@
+"""
+PCO DIMAX acquisitions: projection, flat and dark saved as a triplet of files.
+"""
+
+import os
+import re
+import threading
+import contextlib
+import collections
+
+import h5py
+
+import log_lib
+
+
+# data set files: name_number.ext
+NAME = re.compile(r'^(?P<base>.*)_(?P<number>\d+)(?P<ext>\.h5|\.hdf|\.hdf5)$')
+
+DATASETS = ('exchange/data', 'exchange/data_white', 'exchange/data_dark')
+
+
+class H5Pool(object):
+    """
+    Read-only h5py files kept open, the least recently used are closed past maxsize.
+
+    A file is only closed once no reader holds it: open() counts its readers.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._files = collections.OrderedDict()
+        self._readers = collections.Counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def open(self, fname):
+        """
+        h5py file of fname, kept open at least until the with block exits.
+        """
+
+        fname = os.path.abspath(fname)
+        with self._lock:
+            h5 = self._files.get(fname)
+            if h5 is None:
+                h5 = self._files[fname] = h5py.File(fname, 'r')
+            self._files.move_to_end(fname)
+            self._readers[fname] += 1
+        try:
+            yield h5
+        finally:
+            with self._lock:
+                self._readers[fname] -= 1
+                if self._readers[fname] == 0:
+                    del self._readers[fname]
+                self._evict()
+
+    def _evict(self):
+        # least recently used first, skipping the files being read
+        for fname in list(self._files):
+            if len(self._files) <= self.maxsize:
+                break
+            if fname not in self._readers:
+                self._files.pop(fname).close()
+
+    def close(self):
+        with self._lock:
+            for fname in list(self._files):
+                if fname not in self._readers:
+                    self._files.pop(fname).close()
+
+
+pool = H5Pool()
+
+
+class DimaxIndex(object):
+    """
+    proj/flat/dark triplets of the DIMAX files of a folder.
+
+    A triplet is three consecutive numbers of the same base name whose first file has
+    the most projections; the shapes of the DATASETS of each file are read once.
+
+    Parameters
+    ----------
+    top : str
+        Folder of the data sets.
+    """
+
+    def __init__(self, top):
+        self.top = os.path.abspath(top)
+        self.mtime = os.stat(self.top).st_mtime
+        self.shapes = {}
+        self.triplets = {}
+
+        series = collections.defaultdict(dict)
+        for name in sorted(os.listdir(self.top)):
+            match = NAME.match(name)
+            if match is not None:
+                series[match.group('base'), match.group('ext')][int(match.group('number'))] = name
+
+        for files in series.values():
+            for name in files.values():
+                self.shapes[name] = self._shapes(name)
+            numbers = sorted(files)
+            i = 0
+            while i < len(numbers):
+                n = numbers[i]
+                if n + 1 in files and n + 2 in files:
+                    proj, flat, dark = files[n], files[n + 1], files[n + 2]
+                    if self.nframes(proj, 'exchange/data') > max(self.nframes(flat, 'exchange/data'), self.nframes(dark, 'exchange/data')):
+                        self.triplets[proj] = (flat, dark)
+                        i += 3
+                        continue
+                i += 1
+
+    def _shapes(self, name):
+        try:
+            with pool.open(os.path.join(self.top, name)) as h5:
+                return dict((dataset, h5[dataset].shape) for dataset in DATASETS if dataset in h5)
+        except (IOError, OSError) as error:
+            log_lib.warning("  *** skipping %s: %s" % (name, error))
+            return {}
+
+    def nframes(self, name, dataset):
+        return self.shapes.get(name, {}).get(dataset, (0,))[0]
+
+
+_indexes = {}
+
+
+def index(top):
+    """
+    DimaxIndex of a folder, built again when files were added or removed.
+    """
+
+    top = os.path.abspath(top)
+    cached = _indexes.get(top)
+    if cached is None or cached.mtime != os.stat(top).st_mtime:
+        cached = _indexes[top] = DimaxIndex(top)
+    return cached
+
+
+def flat_dark(fname):
+    """
+    Flat and dark file names of a DIMAX projection file, from the folder index or, when
+    the folder does not hold a complete triplet, the next two file numbers.
+    """
+
+    top, name = os.path.split(os.path.abspath(fname))
+    triplet = index(top).triplets.get(name)
+    if triplet is None:
+        match = NAME.match(name)
+        if match is None:
+            raise ValueError("%s is not a DIMAX file name_number.h5" % fname)
+        number, width = int(match.group('number')), len(match.group('number'))
+        triplet = tuple('%s_%0*d%s' % (match.group('base'), width, number + k, match.group('ext')) for k in (1, 2))
+        log_lib.warning("  *** %s is not indexed as a DIMAX triplet, using %s and %s" % (name, triplet[0], triplet[1]))
+    return tuple(os.path.join(top, other) for other in triplet)
+
+
+def read(fname, dataset, sino=None):
+    """
+    Read a dataset of a file, all the frames of the sinogram range sino (all rows for None).
+    """
+
+    with pool.open(fname) as h5:
+        if sino is None:
+            return h5[dataset][:]
+        return h5[dataset][:, sino[0]:sino[1]]
+
+
+def read_flat_dark(fname, sino=None):
+    """
+    Flat frames of the flat file and dark frames of the dark file of a DIMAX projection file.
+    """
+
+    flat_fname, dark_fname = flat_dark(fname)
+    return read(flat_fname, 'exchange/data_white', sino), read(dark_fname, 'exchange/data_dark', sino)
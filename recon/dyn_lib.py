@@ -0,0 +1,111 @@
+"""
+Time frames of continuous rotation (dynamic) scans reconstructed by filtered backprojection.
+"""
+
+import collections
+
+import numpy as np
+
+import fbp_lib
+
+
+# above this number of blocks per frame the frames are backprojected one by one
+MAX_BLOCKS = 8
+
+
+def frames(nproj, length, overlap=0):
+    """
+    (start, end) projection ranges of the frames of a scan of nproj projections.
+    """
+
+    if length <= 0 or length > nproj:
+        raise ValueError("frame length %d not in [1, %d]" % (length, nproj))
+    if overlap < 0 or overlap >= length:
+        raise ValueError("frame overlap %d not in [0, %d]" % (overlap, length - 1))
+    step = length - overlap
+    return [(start, start + length) for start in range(0, nproj - length + 1, step)]
+
+
+def frame_length(theta):
+    """
+    Number of projections of a 180 degree rotation, the default frame length.
+    """
+
+    return int(round(np.pi / np.median(np.abs(np.diff(theta)))))
+
+
+def blocks(length, overlap=0, max_blocks=MAX_BLOCKS):
+    """
+    Projections per backprojected block and blocks per frame, 0 blocks when the frames are backprojected one by one.
+    """
+
+    block = int(np.gcd(length, length - overlap))
+    nblocks = length // block
+    if nblocks > max_blocks:
+        return length, 0
+    return block, nblocks
+
+
+def images(length, overlap=0, max_blocks=MAX_BLOCKS):
+    """
+    Number of (pixels, rows) float32 images held while reconstructing a frame: its blocks, their sum and the slices.
+    """
+
+    return max(1, blocks(length, overlap, max_blocks)[1]) + 2
+
+
+def recon(data, theta, center, length, overlap=0, filter_name='parzen', mask_ratio=None, ncore=None, max_blocks=MAX_BLOCKS):
+    """
+    Reconstruct the frames of -log projections, one at a time.
+
+    Parameters
+    ----------
+    data : ndarray
+        -log projections of shape (nproj, rows, N) of the whole scan.
+    theta : ndarray
+        Projection angles in radians, over the whole scan (more than pi for several frames).
+    center : float or ndarray
+        Rotation axis location (pixel), or one location per row.
+    length, overlap : int
+        Number of projections of a frame and of projections shared by consecutive frames.
+    filter_name : str
+        Window of the ramp filter, see fbp_lib.FILTERS.
+    mask_ratio : float
+        Reconstruct only inside the circle of tomopy.circ_mask(ratio=mask_ratio), 0 outside.
+    ncore : int
+        Number of threads.
+    max_blocks : int
+        Largest number of block images kept, see blocks().
+
+    Yields
+    ------
+    frame : int
+        Frame index.
+    rec : ndarray
+        float32 slices of shape (rows, N, N) of the frame.
+    """
+
+    nproj, nrows, ncol = data.shape
+    ranges = frames(nproj, length, overlap)
+    filtered = fbp_lib.filter_sinogram(data[:ranges[-1][1]], filter_name, ncore, nproj=length)
+    # (nproj, N, rows) lines, as Projector.adjoint() reads them
+    filtered = filtered.transpose(0, 2, 1)
+    projector = fbp_lib.Projector(theta, ncol, center, nrows, mask_ratio, ncore)
+
+    block, nblocks = blocks(length, overlap, max_blocks)
+    if nblocks == 0:
+        for k, (start, end) in enumerate(ranges):
+            yield k, projector.to_slices(projector.adjoint(filtered[start:end], first=start))
+        return
+
+    images = collections.deque(maxlen=nblocks)
+    b = 0
+    for k, (start, end) in enumerate(ranges):
+        # backproject the blocks of the frame that the previous frames did not need
+        while b * block < end:
+            images.append(projector.adjoint(filtered[b * block:(b + 1) * block], first=b * block))
+            b += 1
+        image = images[0].copy()
+        for other in list(images)[1:]:
+            image += other
+        yield k, projector.to_slices(image)
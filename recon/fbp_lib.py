@@ -0,0 +1,365 @@
+"""
+Filtered backprojection of parallel beam sinograms without a padded volume.
+"""
+
+import os
+
+import numpy as np
+import scipy.sparse
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+import pipeline_lib
+
+
+# bytes of projection lines filtered by one task
+BLOCK_BYTES = 2**22
+
+# pixels per tile of the compiled backprojection
+TILE = 1024
+
+FILTERS = ('none', 'ramlak', 'shepp', 'cosine', 'hann', 'hamming', 'parzen', 'butterworth')
+
+
+def fft_length(ncol):
+    """
+    Filter FFT length: a power of 2 leaving at least ncol/4 padding columns on each side, as the 3N/2 padding.
+    """
+
+    return int(np.power(2, np.ceil(np.log2(3 * ncol / 2))))
+
+
+def _window(filter_name, x):
+    # x: frequency in units of the Nyquist frequency, 0 to 1
+    if filter_name in ('none', 'ramlak'):
+        return np.ones_like(x)
+    if filter_name == 'shepp':
+        return np.sinc(x / 2)
+    if filter_name == 'cosine':
+        return np.cos(np.pi * x / 2)
+    if filter_name == 'hann':
+        return 0.5 + 0.5 * np.cos(np.pi * x)
+    if filter_name == 'hamming':
+        return 0.54 + 0.46 * np.cos(np.pi * x)
+    if filter_name == 'parzen':
+        return np.where(x <= 0.5, 1 - 6 * x ** 2 * (1 - x), 2 * (1 - x) ** 3)
+    if filter_name == 'butterworth':
+        return 1 / (1 + (x / 0.5) ** 4)
+    raise ValueError("unknown filter %r, one of %s" % (filter_name, ', '.join(FILTERS)))
+
+
+def ramp_filter(n, filter_name='parzen'):
+    """
+    Windowed ramp filter on the rfft grid of n samples, from the band-limited ramp kernel (Kak and Slaney).
+    """
+
+    k = np.minimum(np.arange(n), n - np.arange(n))
+    kernel = np.zeros(n)
+    kernel[0] = 0.25
+    odd = k % 2 == 1
+    kernel[odd] = -1 / np.square(np.pi * k[odd])
+    ramp = 2 * np.real(np.fft.rfft(kernel))
+    return (ramp * _window(filter_name, np.fft.rfftfreq(n) * 2)).astype(np.float32)
+
+
+def filter_sinogram(data, filter_name='parzen', ncore=None, nproj=None, scale=None):
+    """
+    Ramp filter the projection lines, padded by edge replication inside the FFT.
+
+    Parameters
+    ----------
+    data : ndarray
+        -log projections of shape (nproj, rows, columns).
+    filter_name : str
+        Window of the ramp filter, see FILTERS.
+    ncore : int
+        Number of threads.
+    nproj : int
+        Number of projections backprojected into each slice, None for all of data (see dyn_lib).
+    scale : float
+        Factor of the ramp, None for the scale of backproject(), pi / (2 nproj). With 1 the
+        ramp is the |2x| ramp of tomopy gridrec (x in cycles per pixel).
+
+    Returns
+    -------
+    ndarray
+        float32 filtered projections of the shape of data, scaled for backproject().
+    """
+
+    nlines, nrows, ncol = data.shape
+    nproj = nproj or nlines
+    n = fft_length(ncol)
+    pad = (n - ncol) // 2
+    ramp = ramp_filter(n, filter_name) * np.float32(np.pi / (2 * nproj) if scale is None else scale)
+    out = np.empty(data.shape, dtype=np.float32)
+
+    def block(start, end):
+        line = np.empty((end - start, nrows, n), dtype=np.float32)
+        line[..., pad:pad + ncol] = data[start:end]
+        line[..., :pad] = data[start:end, :, :1]
+        line[..., pad + ncol:] = data[start:end, :, -1:]
+        out[start:end] = np.fft.irfft(np.fft.rfft(line, axis=-1) * ramp, n=n, axis=-1)[..., pad:pad + ncol]
+
+    step = max(1, BLOCK_BYTES // max(1, nrows * n * 4))
+    pipeline_lib.thread_map(block, [(i, min(i + step, nlines)) for i in range(0, nlines, step)], ncore)
+    return out
+
+
+def grid(size):
+    """
+    (x, y) pixel coordinates of an N x N slice relative to the rotation axis: x along the columns, y along the rows.
+    """
+
+    axis = np.arange(size, dtype=np.float32) - (size - 1) / 2
+    y, x = np.meshgrid(axis, axis, indexing='ij')
+    return x.ravel(), y.ravel()
+
+
+if numba is not None:
+
+    @numba.njit(nogil=True, fastmath=True)
+    def _column(t, last):
+        # padded line column left of position t and the interpolation weight of the next one
+        t = min(max(t, np.float32(0)), np.float32(last))
+        i = min(int(t), last - 1)
+        return i, t - np.float32(i)
+
+    @numba.njit(nogil=True, fastmath=True)
+    def _adjoint_band(lines, x, y, cos, sin, centers, tilted, first, out):
+        # out[k, r] = sum over p of lines[p] interpolated at the position of pixel k in row r,
+        # by tiles of pixels whose sums stay in cache while the projections are added
+        npix, nrows = out.shape
+        last = lines.shape[1] - 1
+        out[...] = 0
+        for k0 in range(0, npix, TILE):
+            for p in range(lines.shape[0]):
+                c, s = cos[first + p], sin[first + p]
+                for k in range(k0, min(k0 + TILE, npix)):
+                    base = x[k] * c - y[k] * s + np.float32(1)
+                    if tilted:
+                        for r in range(nrows):
+                            i, t = _column(base + centers[r], last)
+                            v = lines[p, i, r]
+                            out[k, r] += v + t * (lines[p, i + 1, r] - v)
+                    else:
+                        i, t = _column(base + centers[0], last)
+                        for r in range(nrows):
+                            v = lines[p, i, r]
+                            out[k, r] += v + t * (lines[p, i + 1, r] - v)
+
+    @numba.njit(nogil=True, fastmath=True)
+    def _forward_angles(image, x, y, cos, sin, centers, tilted, start, end, lines):
+        # lines[p] += pixels of image spread over the two columns around their position, for p in start:end
+        npix, nrows = image.shape
+        last = lines.shape[1] - 1
+        for p in range(start, end):
+            c, s = cos[p], sin[p]
+            for k in range(npix):
+                base = x[k] * c - y[k] * s + np.float32(1)
+                if tilted:
+                    for r in range(nrows):
+                        i, t = _column(base + centers[r], last)
+                        v = image[k, r] * t
+                        lines[p, i, r] += image[k, r] - v
+                        lines[p, i + 1, r] += v
+                else:
+                    i, t = _column(base + centers[0], last)
+                    for r in range(nrows):
+                        v = image[k, r] * t
+                        lines[p, i, r] += image[k, r] - v
+                        lines[p, i + 1, r] += v
+
+
+def mask_pixels(size, ratio=None):
+    """
+    Flat indices of the pixels of an N x N slice inside the circle of tomopy.circ_mask(ratio), all of them for None.
+    """
+
+    if ratio is None:
+        return np.arange(size * size)
+    x, y = grid(size)
+    return np.flatnonzero(np.square(x) + np.square(y) < np.square(ratio * size / 2))
+
+
+class Projector(object):
+    """
+    Linear interpolation projector between N x N slices and parallel beam sinograms.
+
+    Images are (pixels, rows) arrays of the pixels inside the mask, sinograms (nproj, N, rows) arrays.
+
+    Parameters
+    ----------
+    theta : ndarray
+        Projection angles in radians.
+    ncol : int
+        Detector width N.
+    center : float or ndarray
+        Rotation axis location (pixel), or one location per row.
+    nrows : int
+        Number of rows (slices).
+    mask_ratio : float
+        Only the pixels inside the circle of tomopy.circ_mask(ratio=mask_ratio), None for the whole grid.
+    ncore : int
+        Number of threads.
+    """
+
+    def __init__(self, theta, ncol, center, nrows, mask_ratio=None, ncore=None):
+        self.ncol = ncol
+        self.nrows = nrows
+        self.cos = np.cos(theta).astype(np.float32)
+        self.sin = np.sin(theta).astype(np.float32)
+        self.pixels = mask_pixels(ncol, mask_ratio)
+        self.x, self.y = (coord[self.pixels] for coord in grid(ncol))
+        self.centers = np.ascontiguousarray(np.broadcast_to(np.asarray(center, dtype=np.float32), (nrows,)))
+        # rows sharing a center (all of them without tilt) are processed together
+        self.groups = [(c, np.flatnonzero(self.centers == c)) for c in np.unique(self.centers)]
+        self.ncore = ncore or os.cpu_count() or 1
+        self.bands = [(band[0], band[-1] + 1) for band in np.array_split(np.arange(self.pixels.size), self.ncore) if band.size]
+
+    def _position(self, p, center, start=0, end=None):
+        # p: index in theta
+        # column of the padded line left of pixels start:end and the interpolation weight of the next one
+        t = self.x[start:end] * self.cos[p] - self.y[start:end] * self.sin[p] + (center + 1)
+        np.clip(t, 0, self.ncol + 1, out=t)
+        i = np.minimum(t.astype(np.intp), self.ncol)
+        t -= i
+        return i, t
+
+    def adjoint(self, sino, first=0):
+        """
+        Backprojection of sinograms of shape (nproj, N, rows) into an image of shape (pixels, rows).
+
+        sino may hold only the projections first, first + 1, ... of theta.
+        """
+
+        nproj = sino.shape[0]
+        # lines with a zero column on each side for the pixels projected off the detector
+        lines = np.zeros((nproj, self.ncol + 2, self.nrows), dtype=np.float32)
+        lines[:, 1:-1] = sino
+        image = np.empty((self.pixels.size, self.nrows), dtype=np.float32)
+
+        if numba is not None:
+            # compiled, all the rows in one pass even with one center per row
+            tilted = len(self.groups) > 1
+
+            def compiled(start, end):
+                _adjoint_band(lines, self.x[start:end], self.y[start:end], self.cos, self.sin, self.centers, tilted, first, image[start:end])
+
+            pipeline_lib.thread_map(compiled, self.bands, self.ncore)
+            return image
+
+        for center, rows in self.groups:
+            sub = lines if rows.size == self.nrows else np.ascontiguousarray(lines[..., rows])
+            out = image if rows.size == self.nrows else np.empty((self.pixels.size, rows.size), dtype=np.float32)
+
+            def band(start, end):
+                acc = out[start:end]
+                acc[...] = 0
+                value = np.empty(acc.shape, dtype=np.float32)
+                slope = np.empty(acc.shape, dtype=np.float32)
+                for p in range(nproj):
+                    i, t = self._position(first + p, center, start, end)
+                    np.take(sub[p], i, axis=0, out=value)
+                    np.take(sub[p], i + 1, axis=0, out=slope)
+                    slope -= value
+                    slope *= t[:, np.newaxis]
+                    acc += value
+                    acc += slope
+
+            pipeline_lib.thread_map(band, self.bands, self.ncore)
+            if out is not image:
+                image[:, rows] = out
+
+        return image
+
+    def forward(self, image):
+        """
+        Projection of an image of shape (pixels, rows) into sinograms of shape (nproj, N, rows).
+        """
+
+        nproj, ncol, nrows = self.cos.size, self.ncol, self.nrows
+        # lines with a column on each side collecting the pixels projected off the detector
+        lines = np.zeros((nproj, ncol + 2, nrows), dtype=np.float32)
+        image = np.ascontiguousarray(image, dtype=np.float32)
+        tilted = len(self.groups) > 1
+
+        def angles(start, end):
+            if numba is not None:
+                _forward_angles(image, self.x, self.y, self.cos, self.sin, self.centers, tilted, start, end, lines)
+                return
+            # sparse (N + 2, pixels) interpolation matrix of each projection, two entries per
+            # pixel, applied to all the rows sharing a center (all of them without tilt) at once
+            npix = self.pixels.size
+            indptr = np.arange(0, 2 * npix + 1, 2)
+            index = np.empty(2 * npix, dtype=np.intp)
+            weight = np.empty(2 * npix, dtype=np.float32)
+            for p in range(start, end):
+                for center, rows in self.groups:
+                    i, t = self._position(p, center)
+                    index[0::2], index[1::2] = i, i + 1
+                    weight[0::2], weight[1::2] = 1 - t, t
+                    matrix = scipy.sparse.csc_matrix((weight, index, indptr), shape=(ncol + 2, npix))
+                    if rows.size == nrows:
+                        lines[p] = matrix @ image
+                    else:
+                        lines[p][:, rows] = matrix @ image[:, rows]
+
+        step = -(-nproj // self.ncore)
+        pipeline_lib.thread_map(angles, [(p, min(p + step, nproj)) for p in range(0, nproj, step)], self.ncore)
+
+        return np.ascontiguousarray(lines[:, 1:ncol + 1])
+
+    def to_slices(self, image):
+        """
+        Slices of shape (rows, N, N) of an image, 0 outside the mask.
+        """
+
+        rec = np.zeros((self.ncol * self.ncol, self.nrows), dtype=np.float32)
+        rec[self.pixels] = image
+        return np.ascontiguousarray(rec.T).reshape(self.nrows, self.ncol, self.ncol)
+
+    def from_slices(self, rec):
+        """
+        Image of slices of shape (rows, N, N).
+        """
+
+        return np.ascontiguousarray(rec.reshape(self.nrows, -1)[:, self.pixels].T, dtype=np.float32)
+
+
+def backproject(filtered, theta, center, mask_ratio=None, ncore=None):
+    """
+    Backproject filtered projections onto the N x N grid of the detector width.
+
+    Parameters
+    ----------
+    filtered : ndarray
+        Projections of shape (nproj, rows, N) from filter_sinogram().
+    theta : ndarray
+        Projection angles in radians.
+    center : float or ndarray
+        Rotation axis location (pixel), or one location per row.
+    mask_ratio : float
+        Backproject only inside the circle of tomopy.circ_mask(ratio=mask_ratio), 0 outside; None for the whole grid.
+    ncore : int
+        Number of threads; each one backprojects a band of pixels for all the rows.
+
+    Returns
+    -------
+    ndarray
+        float32 slices of shape (rows, N, N).
+    """
+
+    nproj, nrows, ncol = filtered.shape
+    projector = Projector(theta, ncol, center, nrows, mask_ratio, ncore)
+    return projector.to_slices(projector.adjoint(filtered.transpose(0, 2, 1)))
+
+
+def recon(data, theta, center, filter_name='parzen', mask_ratio=None, ncore=None):
+    """
+    Filtered backprojection of -log projections of shape (nproj, rows, N) into slices of shape (rows, N, N).
+    """
+
+    return backproject(filter_sinogram(data, filter_name, ncore), theta, center, mask_ratio, ncore)
@@ -0,0 +1,177 @@
+"""
+Flat and dark frames of a data set averaged once and, on request, cached in an HDF5 file.
+"""
+
+import os
+import hashlib
+import pathlib
+
+import h5py
+import tomopy
+import dxchange.reader as dxreader
+import numpy as np
+
+import log_lib
+
+
+CACHE_DIR = os.path.join(str(pathlib.Path.home()), '.cache', 'recon', 'flat_dark')
+
+# data set file extensions searched for the nearest flat
+EXTENSIONS = ('.h5', '.hdf', '.hdf5')
+
+
+def average(frames, method='mean', zinger_level=None):
+    """
+    Average flat or dark frames.
+
+    Parameters
+    ----------
+    frames : ndarray
+        Frames of shape (n, rows, columns).
+    method : str
+        mean or median.
+    zinger_level : float
+        Remove the zingers above this level (tomopy.remove_outlier) before averaging, None to skip.
+
+    Returns
+    -------
+    ndarray
+        float32 frame of shape (1, rows, columns).
+    """
+
+    frames = np.asarray(frames, dtype=np.float32)
+    if zinger_level is not None:
+        frames = tomopy.misc.corr.remove_outlier(frames, zinger_level, size=15, axis=0)
+    if method == 'median':
+        return np.median(frames, axis=0, keepdims=True).astype(np.float32)
+    return np.mean(frames, axis=0, keepdims=True, dtype=np.float32)
+
+
+class FlatDarkCache(object):
+    """
+    Averaged flat and dark frames of the data sets of a folder.
+
+    Parameters
+    ----------
+    top : str
+        Folder containing the data sets.
+    cache_dir : str
+        Directory of the cache files, e.g. CACHE_DIR; None to average the frames on every call.
+    """
+
+    def __init__(self, top, cache_dir=None):
+        self.top = top
+        self.fname = None
+        if cache_dir is not None:
+            top = os.path.abspath(top)
+            key = hashlib.sha1(top.encode()).hexdigest()[:16]
+            self.fname = os.path.join(cache_dir, '%s_%s.h5' % (os.path.basename(top) or 'root', key))
+
+    @staticmethod
+    def variant(method, zinger_level):
+        if zinger_level is None:
+            return method
+        return '%s_zinger_%g' % (method, zinger_level)
+
+    def _read(self, name, variant, st):
+        if self.fname is None:
+            return None
+        try:
+            with h5py.File(self.fname, 'r') as h5:
+                grp = h5.get('%s/%s' % (name, variant))
+                if grp is None or h5[name].attrs['size'] != st.st_size or h5[name].attrs['mtime'] != st.st_mtime:
+                    return None
+                if grp['flat'].size == 0:
+                    return None, None, 0.0
+                return grp['flat'][:], grp['dark'][:], float(grp.attrs['signal'])
+        except (IOError, OSError, KeyError):
+            return None
+
+    def _write(self, name, variant, st, flat, dark, signal):
+        if self.fname is None:
+            return
+        try:
+            if not os.path.exists(os.path.dirname(self.fname)):
+                os.makedirs(os.path.dirname(self.fname))
+            with h5py.File(self.fname, 'a') as h5:
+                if name in h5 and (h5[name].attrs['size'] != st.st_size or h5[name].attrs['mtime'] != st.st_mtime):
+                    # the data set changed: drop all its averages
+                    del h5[name]
+                top = h5.require_group(name)
+                top.attrs['size'] = st.st_size
+                top.attrs['mtime'] = st.st_mtime
+                if variant in top:
+                    del top[variant]
+                grp = top.create_group(variant)
+                grp.create_dataset('flat', data=flat)
+                grp.create_dataset('dark', data=dark)
+                grp.attrs['signal'] = signal
+        except (IOError, OSError) as error:
+            log_lib.warning("  *** flat/dark cache not saved in %s: %s" % (self.fname, error))
+
+    def get(self, name, method='mean', zinger_level=None):
+        """
+        Averaged flat and dark of a data set of the folder, read from the cache when possible.
+
+        Parameters
+        ----------
+        name : str
+            Data set file name.
+        method, zinger_level
+            See average().
+
+        Returns
+        -------
+        flat, dark : ndarray
+            float32 frames of shape (1, rows, columns), None when the data set has no flats.
+        signal : float
+            Median of flat - dark, 0 when there are no flats.
+        """
+
+        fname = os.path.join(self.top, name)
+        st = os.stat(fname)
+        variant = self.variant(method, zinger_level)
+
+        cached = self._read(name, variant, st)
+        if cached is not None:
+            log_lib.info("  *** flat/dark of %s (%s) from %s" % (name, variant, self.fname))
+            return cached
+
+        log_lib.info("  *** averaging flat/dark of %s (%s)" % (name, variant))
+        flat = dxreader.read_hdf5(fname, 'exchange/data_white')
+        dark = dxreader.read_hdf5(fname, 'exchange/data_dark')
+        if flat is None or len(flat) == 0:
+            # remembered as empty frames, nearest() does not read the data set again
+            self._write(name, variant, st, np.zeros(0, np.float32), np.zeros(0, np.float32), 0.0)
+            return None, None, 0.0
+        flat = average(flat, method, zinger_level)
+        if dark is None or len(dark) == 0:
+            dark = np.zeros_like(flat)
+        else:
+            dark = average(dark, method)
+        signal = float(np.median(flat - dark))
+
+        self._write(name, variant, st, flat, dark, signal)
+        return flat, dark, signal
+
+    def nearest(self, name, method='mean', zinger_level=None):
+        """
+        Data set of the folder with good flats (flat brighter than dark) acquired closest to name.
+
+        The acquisition time is the file mtime; name itself is returned when its flats are good.
+        """
+
+        mtime = os.stat(os.path.join(self.top, name)).st_mtime
+        names = [n for n in os.listdir(self.top) if os.path.splitext(n)[1] in EXTENSIONS]
+        names.sort(key=lambda n: (n != name, abs(os.stat(os.path.join(self.top, n)).st_mtime - mtime)))
+
+        for candidate in names:
+            try:
+                signal = self.get(candidate, method, zinger_level)[2]
+            except (IOError, OSError, KeyError) as error:
+                log_lib.warning("  *** skipping the flats of %s: %s" % (candidate, error))
+                continue
+            if signal > 0:
+                return candidate
+
+        return None
@@ -0,0 +1,132 @@
+"""
+SIRT and CGLS reconstructions on the CPU with a warm start.
+"""
+
+import numpy as np
+
+import fbp_lib
+
+
+METHODS = ('sirt', 'cgls')
+
+
+def _norm(a):
+    return float(np.sqrt(np.vdot(a, a)))
+
+
+def _converged(norms, norm, tol):
+    # norms: residual norms of the previous iterations. Converged when the residual went
+    # down to its lowest value so far by less than tol, not when it went up (e.g. the
+    # first SIRT iterations from an fbp start clipped to non-negative values).
+    if norm == 0:
+        return True
+    return len(norms) > 0 and norm <= min(norms) and norms[-1] - norm < tol * norms[-1]
+
+
+def sirt(projector, b, x, num_iter, tol):
+    """
+    SIRT iterations with a non-negativity constraint (as the MinConstraint of the astra SIRT runs), x is updated in place.
+
+    Returns the number of iterations done.
+    """
+
+    # inverse row and column sums of the system matrix
+    row_sum = projector.forward(np.ones_like(x))
+    row_sum = np.divide(1, row_sum, out=np.zeros_like(row_sum), where=row_sum > 0)
+    col_sum = projector.adjoint(np.ones_like(b))
+    col_sum = np.divide(1, col_sum, out=np.zeros_like(col_sum), where=col_sum > 0)
+
+    norms = []
+    for k in range(num_iter):
+        residual = b - projector.forward(x)
+        norm = _norm(residual)
+        if _converged(norms, norm, tol):
+            return k
+        residual *= row_sum
+        update = projector.adjoint(residual)
+        update *= col_sum
+        x += update
+        np.maximum(x, 0, out=x)
+        norms.append(norm)
+    return num_iter
+
+
+def cgls(projector, b, x, num_iter, tol):
+    """
+    CGLS iterations of the least squares problem, x is updated in place.
+
+    Returns the number of iterations done.
+    """
+
+    residual = b - projector.forward(x)
+    norm = _norm(residual)
+    s = projector.adjoint(residual)
+    p = s.copy()
+    gamma = np.vdot(s, s)
+    norms = []
+
+    for k in range(num_iter):
+        if norm == 0 or gamma == 0:
+            return k
+        q = projector.forward(p)
+        alpha = gamma / np.vdot(q, q)
+        x += alpha * p
+        residual -= alpha * q
+        norms.append(norm)
+        norm = _norm(residual)
+        if _converged(norms, norm, tol):
+            return k + 1
+        s = projector.adjoint(residual)
+        gamma, previous_gamma = np.vdot(s, s), gamma
+        p *= gamma / previous_gamma
+        p += s
+    return num_iter
+
+
+def recon(data, theta, center, method='sirt', init=None, num_iter=200, tol=1e-3, mask_ratio=None, ncore=None):
+    """
+    Iterative reconstruction of -log projections.
+
+    Parameters
+    ----------
+    data : ndarray
+        -log projections of shape (nproj, rows, N).
+    theta : ndarray
+        Projection angles in radians.
+    center : float or ndarray
+        Rotation axis location (pixel), or one location per row.
+    method : str
+        sirt or cgls.
+    init : ndarray
+        Initial slices of shape (rows, N, N), e.g. fbp_lib.recon() of data or the slices of
+        the previous time frame; None to start from 0.
+    num_iter : int
+        Maximum number of iterations.
+    tol : float
+        Stop when an iteration lowers the residual norm, to its lowest value so far, by less
+        than tol times its value; an iteration raising it does not stop.
+    mask_ratio : float
+        Reconstruct only inside the circle of tomopy.circ_mask(ratio=mask_ratio), 0 outside.
+    ncore : int
+        Number of threads.
+
+    Returns
+    -------
+    rec : ndarray
+        float32 slices of shape (rows, N, N).
+    niter : int
+        Number of iterations done.
+    """
+
+    if method not in METHODS:
+        raise ValueError("unknown iterative method %r, one of %s" % (method, ', '.join(METHODS)))
+    nproj, nrows, ncol = data.shape
+    projector = fbp_lib.Projector(theta, ncol, center, nrows, mask_ratio, ncore)
+    b = np.ascontiguousarray(data.transpose(0, 2, 1), dtype=np.float32)
+    if init is None:
+        x = np.zeros((projector.pixels.size, nrows), dtype=np.float32)
+    else:
+        x = projector.from_slices(init)
+
+    niter = (sirt if method == 'sirt' else cgls)(projector, b, x, num_iter, tol)
+    return projector.to_slices(x), niter
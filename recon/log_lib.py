@@ -1,5 +1,7 @@
 import os
+import time
 import logging
+import contextlib
 from datetime import datetime
 
 # Logging defines
@@ -30,6 +32,14 @@ def warning(msg):
     logger.warning(msg, extra=warn_extra)
 
 
+@contextlib.contextmanager
+def timed(stage):
+    """Log the wall time of the with block as a stage of the processing."""
+    start = time.time()
+    yield
+    info("  *** %s: %.2f s" % (stage, time.time() - start))
+
+
 def setup_logger(log_name, stream_to_console=True):
     global logger
     global info_extra
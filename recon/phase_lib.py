@@ -0,0 +1,201 @@
+"""
+Paganin phase retrieval on real FFTs of float32 projections.
+"""
+
+import os
+import functools
+import threading
+import concurrent.futures
+
+import numpy as np
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+import pipeline_lib
+
+
+PLANCK_CONSTANT = 6.58211928e-19    # keV s
+SPEED_OF_LIGHT = 299792458e+2       # cm/s
+
+
+def wavelength(energy):
+    return 2 * np.pi * PLANCK_CONSTANT * SPEED_OF_LIGHT / energy
+
+
+def pad_width(dim, pixel_size, energy, dist):
+    """
+    Padding on each side of a projection axis, as tomopy: up to a power of 2 that holds the Fresnel fringes.
+    """
+
+    pad_pix = np.ceil(np.pi * wavelength(energy) * dist / pixel_size ** 2)
+    return int((np.power(2, np.ceil(np.log2(dim + pad_pix))) - dim) * 0.5)
+
+
+def paganin_filter(shape, pixel_size, energy, dist, alpha):
+    """
+    Paganin filter on the numpy rfft2 grid of a padded projection of shape (rows, columns).
+    """
+
+    # tomopy's reciprocal grid spans +/- 2 pi / pixel_size
+    ky = 4 * np.pi * np.fft.fftfreq(shape[0], d=pixel_size)
+    kx = 4 * np.pi * np.fft.rfftfreq(shape[1], d=pixel_size)
+    w2 = np.add.outer(ky ** 2, kx ** 2)
+
+    phase_filter = 1 / (wavelength(energy) * dist * w2 / (4 * np.pi) + alpha)
+    return (phase_filter / phase_filter.max()).astype(np.float32)
+
+
+def sweep(data, rows, pixel_size, energy, params, ncore=None):
+    """
+    Phase retrieved rows of every projection for several (distance, alpha) pairs, from one FFT per projection.
+
+    Parameters
+    ----------
+    data : ndarray
+        Normalized projections of shape (nproj, rows, columns).
+    rows : list
+        Rows of data to return.
+    pixel_size, energy : float
+        Detector pixel size (cm) and X-ray energy (keV).
+    params : list
+        (sample detector distance (cm), alpha) pairs. The padding is set by the largest distance.
+    ncore : int
+        Number of threads.
+
+    Returns
+    -------
+    ndarray
+        float32 array of shape (len(params), nproj, len(rows), columns).
+    """
+
+    nproj, dy, dz = data.shape
+    dist = max(d for d, alpha in params)
+    py = pad_width(dy, pixel_size, energy, dist)
+    pz = pad_width(dz, pixel_size, energy, dist)
+    shape = (dy + 2 * py, dz + 2 * pz)
+
+    filters = np.stack([paganin_filter(shape, pixel_size, energy, d, alpha) for d, alpha in params])
+    # inverse DFT along the (padded) rows evaluated at the requested rows
+    inverse_rows = np.exp(2j * np.pi * np.outer(np.asarray(rows) + py, np.arange(shape[0])) / shape[0]) / shape[0]
+    inverse_rows = inverse_rows.astype(np.complex64)
+
+    out = np.empty((len(params), nproj, len(rows), dz), dtype=np.float32)
+
+    def retrieve(m):
+        spectrum = np.fft.rfft2(np.pad(np.asarray(data[m], dtype=np.float32), ((py, py), (pz, pz)), mode='edge'))
+        filtered_rows = np.matmul(inverse_rows, filters * spectrum)
+        out[:, m] = np.fft.irfft(filtered_rows, n=shape[1], axis=-1)[..., pz:pz + dz]
+
+    pipeline_lib.thread_map(retrieve, [(m,) for m in range(nproj)], ncore)
+
+    return out
+
+
+class PhaseRetrieval(object):
+    """
+    Paganin phase retrieval of projections of one shape and geometry.
+
+    Its threads, each with its own FFT buffers and plans, live until close() or the end of a with block.
+
+    Parameters
+    ----------
+    shape : tuple
+        (rows, columns) of a projection.
+    pixel_size, dist, energy, alpha
+        As tomopy.prep.phase.retrieve_phase: cm, cm, keV.
+    ncore : int
+        Number of threads.
+    """
+
+    def __init__(self, shape, pixel_size, dist, energy, alpha, ncore=None):
+        self.shape = tuple(shape)
+        self.py = pad_width(shape[0], pixel_size, energy, dist)
+        self.pz = pad_width(shape[1], pixel_size, energy, dist)
+        self.padded = (shape[0] + 2 * self.py, shape[1] + 2 * self.pz)
+        self.filter = paganin_filter(self.padded, pixel_size, energy, dist, alpha)
+        self.ncore = ncore or os.cpu_count() or 1
+        self._local = threading.local()
+        self._pool = concurrent.futures.ThreadPoolExecutor(self.ncore)
+
+    def _buffers(self):
+        local = self._local
+        if not hasattr(local, 'frame'):
+            spectrum_shape = (self.padded[0], self.padded[1] // 2 + 1)
+            if pyfftw is not None:
+                local.frame = pyfftw.empty_aligned(self.padded, dtype='float32')
+                local.spectrum = pyfftw.empty_aligned(spectrum_shape, dtype='complex64')
+                local.forward = pyfftw.FFTW(local.frame, local.spectrum, axes=(0, 1))
+                local.backward = pyfftw.FFTW(local.spectrum, local.frame, axes=(0, 1), direction='FFTW_BACKWARD')
+            else:
+                local.frame = np.empty(self.padded, dtype=np.float32)
+                local.spectrum = np.empty(spectrum_shape, dtype=np.complex64)
+                local.forward = lambda: np.fft.rfft2(local.frame, out=local.spectrum)
+                # no out= for irfft2: numpy fills it wrongly for 2D transforms
+                def backward():
+                    local.frame[...] = np.fft.irfft2(local.spectrum, s=self.padded)
+                local.backward = backward
+        return local
+
+    def _retrieve(self, proj):
+        local = self._buffers()
+        frame, py, pz = local.frame, self.py, self.pz
+        dy, dz = self.shape
+
+        # edge padding, as tomopy
+        frame[py:py + dy, pz:pz + dz] = proj
+        frame[:py] = frame[py]
+        frame[py + dy:] = frame[py + dy - 1]
+        frame[:, :pz] = frame[:, pz:pz + 1]
+        frame[:, pz + dz:] = frame[:, pz + dz - 1:pz + dz]
+
+        local.forward()
+        local.spectrum *= self.filter
+        local.backward()
+        proj[...] = frame[py:py + dy, pz:pz + dz]
+
+    def __call__(self, data):
+        """
+        Retrieve the phase of float32 projections of shape (nproj, rows, columns) in place.
+        """
+
+        for _ in self._pool.map(self._retrieve, data):
+            pass
+        return data
+
+    def close(self):
+        """
+        Stop the threads, releasing their buffers and plans.
+        """
+
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        # e.g. dropped from the _phase_retrieval cache
+        pool = getattr(self, '_pool', None)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+@functools.lru_cache(maxsize=4)
+def _phase_retrieval(shape, pixel_size, dist, energy, alpha, ncore):
+    return PhaseRetrieval(shape, pixel_size, dist, energy, alpha, ncore)
+
+
+def retrieve_phase(data, pixel_size, dist, energy, alpha, ncore=None):
+    """
+    tomopy.prep.phase.retrieve_phase(pad=True) of float32 projections, in place.
+
+    The PhaseRetrieval of a geometry is kept for the next chunks of the same shape.
+    """
+
+    data = np.asarray(data, dtype=np.float32)
+    return _phase_retrieval(data.shape[1:], pixel_size, dist, energy, alpha, ncore)(data)
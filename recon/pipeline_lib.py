@@ -0,0 +1,197 @@
+"""
+Bounded read / reconstruct / write pipeline used by the full volume reconstruction.
+"""
+
+import os
+import threading
+import queue
+import concurrent.futures
+
+import log_lib
+
+
+# sentinel marking the end of a stage output
+_DONE = object()
+
+# default size of the queues between the stages
+DEPTH = 2
+
+
+def put(q, item, running):
+    """
+    Put item on a bounded queue, blocking while it is full as long as running() is True; False when it gave up.
+    """
+    while running():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def thread_map(func, tasks, ncore=None):
+    """
+    Return [func(*task) for task in tasks], run by ncore threads (all cores by default).
+    """
+    ncore = ncore or os.cpu_count() or 1
+    if ncore == 1 or len(tasks) <= 1:
+        return [func(*task) for task in tasks]
+    with concurrent.futures.ThreadPoolExecutor(min(ncore, len(tasks))) as pool:
+        return list(pool.map(lambda task: func(*task), tasks))
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def run(items, read, process, write, nworkers=1, depth=DEPTH):
+    """
+    Run read, process and write on a list of items with the three stages overlapping.
+
+    Parameters
+    ----------
+    items : list
+        Work items, e.g. the (start, end) sinogram range of each chunk.
+    read : callable
+        read(item) returns the raw data of an item. Called from a single reader thread.
+    process : callable
+        process(item, data) returns the result of an item. Called from nworkers threads.
+    write : callable
+        write(item, result) stores the result of an item. Called from a single writer thread,
+        results may arrive out of order when nworkers > 1.
+    nworkers : int
+        Number of threads running process.
+    depth : int
+        Size of the queues between the stages.
+    """
+
+    nworkers = max(1, int(nworkers))
+    read_queue = queue.Queue(maxsize=max(1, depth))
+    write_queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    errors = []
+
+    def running():
+        # the stages give up as soon as another one failed
+        return not stop.is_set()
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def reader():
+        try:
+            for item in items:
+                if not put(read_queue, (item, read(item)), running):
+                    return
+        except Exception as error:
+            fail(error)
+        finally:
+            for _ in range(nworkers):
+                put(read_queue, _DONE, running)
+
+    def worker():
+        try:
+            while True:
+                entry = _get(read_queue, stop)
+                if entry is _DONE:
+                    break
+                item, data = entry
+                result = process(item, data)
+                del data
+                if not put(write_queue, (item, result), running):
+                    break
+        except Exception as error:
+            fail(error)
+        finally:
+            put(write_queue, _DONE, running)
+
+    def writer():
+        done = 0
+        try:
+            while done < nworkers:
+                entry = _get(write_queue, stop)
+                if entry is _DONE:
+                    if stop.is_set():
+                        break
+                    done += 1
+                    continue
+                item, result = entry
+                write(item, result)
+        except Exception as error:
+            fail(error)
+
+    threads = [threading.Thread(target=reader, name='rec-reader')]
+    threads += [threading.Thread(target=worker, name='rec-worker-%d' % i) for i in range(nworkers)]
+    threads += [threading.Thread(target=writer, name='rec-writer')]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        log_lib.error("  *** pipeline stopped: %s" % errors[0])
+        raise errors[0]
+
+
+def parse_size(size):
+    """
+    Convert a memory size like 48G, 512M or 1.5T into bytes.
+
+    Parameters
+    ----------
+    size : str
+        Size with an optional K, M, G or T (binary) suffix.
+
+    Returns
+    -------
+    int
+        Size in bytes.
+    """
+
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    size = str(size).strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(float(size))
+
+
+def largest_chunk(nrows, chunk_bytes, budget, step=1):
+    """
+    Find the largest power of 2 chunk height whose memory footprint fits a budget.
+
+    Parameters
+    ----------
+    nrows : int
+        Number of detector rows (sinograms) in the data set.
+    chunk_bytes : callable
+        chunk_bytes(rows) returns the peak memory used by the pipeline when
+        reconstructing chunks of rows sinograms.
+    budget : int
+        Memory budget in bytes.
+    step : int
+        Smallest chunk height, the returned height is a multiple of it.
+
+    Returns
+    -------
+    int
+        Chunk height in sinograms.
+    """
+
+    rows = max(1, int(step))
+    best = rows
+    while rows <= nrows:
+        if chunk_bytes(rows) > budget:
+            break
+        best = rows
+        rows *= 2
+    if chunk_bytes(best) > budget:
+        log_lib.warning("  *** memory budget too small: %d sinograms per chunk need %.1f GB" % (best, chunk_bytes(best) / 2.0**30))
+    return best
@@ -0,0 +1,193 @@
+"""
+Fused, in place preprocessing of float32 projection chunks.
+"""
+
+import threading
+
+import numpy as np
+
+import pipeline_lib
+
+
+# bytes of projections processed by one task, small enough to stay in the cache
+BLOCK_BYTES = 2**22
+
+
+def _blocks(nproj, frame_bytes):
+    step = max(1, BLOCK_BYTES // max(1, frame_bytes))
+    return [(i, min(i + step, nproj)) for i in range(0, nproj, step)]
+
+
+def _map(func, data, ncore=None):
+    # run func(start, end) on the projection blocks of data
+    pipeline_lib.thread_map(func, _blocks(data.shape[0], data[0].nbytes if data.shape[0] else 0), ncore)
+
+
+def _remove_invalid(block):
+    # remove_nan, remove_neg and the inf cleanup: nan, +/-inf and negative values set to 0
+    np.nan_to_num(block, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    np.maximum(block, 0.0, out=block)
+
+
+def normalize(proj, flat, dark, cutoff=None, ncore=None):
+    """
+    Flat and dark field correction, as tomopy.normalize, in one pass.
+
+    Parameters
+    ----------
+    proj : ndarray
+        Projections of shape (nproj, rows, columns); a float32 array is overwritten.
+    flat, dark : ndarray
+        Flat and dark frames of shape (n, rows, columns), averaged over the first axis.
+    cutoff : float
+        Upper limit of the normalized values, None for no limit.
+    ncore : int
+        Number of threads.
+
+    Returns
+    -------
+    ndarray
+        float32 normalized projections.
+    """
+
+    flat = np.mean(flat, axis=0, dtype=np.float32)
+    dark = np.mean(dark, axis=0, dtype=np.float32)
+    denom = flat - dark
+    denom[denom < 1e-6] = 1e-6
+    scale = np.reciprocal(denom)
+
+    out = proj if proj.dtype == np.float32 else np.empty(proj.shape, dtype=np.float32)
+
+    def block(start, end):
+        o = out[start:end]
+        np.subtract(proj[start:end], dark, out=o, casting='unsafe')
+        o *= scale
+        if cutoff is not None:
+            np.minimum(o, cutoff, out=o)
+
+    _map(block, out, ncore)
+    return out
+
+
+def minus_log(data, ncore=None):
+    """
+    -log of float32 data followed by the nan/inf/negative cleanup, in place and in one pass.
+    """
+
+    data = np.asarray(data, dtype=np.float32)
+
+    def block(start, end):
+        d = data[start:end]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.log(d, out=d)
+        np.negative(d, out=d)
+        _remove_invalid(d)
+
+    _map(block, data, ncore)
+    return data
+
+
+def remove_invalid(data, ncore=None):
+    """
+    Set the nan, inf and negative values of float32 data to 0, in place and in one pass.
+    """
+
+    data = np.asarray(data, dtype=np.float32)
+
+    _map(lambda start, end: _remove_invalid(data[start:end]), data, ncore)
+    return data
+
+
+def remove_zingers(data, level, size=5, ncore=None):
+    """
+    Replace the zingers of projections by the running median over neighbouring projections, in place.
+
+    A pixel is a zinger when it exceeds the median of the same pixel over size consecutive
+    projections (reflected at the ends of the scan) by more than level. The projection
+    blocks are filtered by a pool of threads; the corrections are written once all the
+    blocks are done, so no block sees the corrected values of another one.
+
+    Parameters
+    ----------
+    data : ndarray
+        Projections of shape (nproj, rows, columns), of any data type.
+    level : float
+        Zinger threshold, in the units of data.
+    size : int
+        Odd number of projections of the running median.
+    ncore : int
+        Number of threads.
+
+    Returns
+    -------
+    ndarray
+        Number of corrected pixels of each projection.
+    """
+
+    nproj = data.shape[0]
+    half = min(size // 2, nproj - 1)
+    corrections = []
+
+    def block(start, end):
+        lo, hi = max(0, start - half), min(nproj, end + half)
+        frames = np.asarray(data[lo:hi], dtype=np.float32)
+        frames = np.pad(frames, ((half - (start - lo), half - (hi - end)), (0, 0), (0, 0)), mode='reflect')
+        windows = np.lib.stride_tricks.sliding_window_view(frames, 2 * half + 1, axis=0)
+        median = np.median(windows, axis=-1)
+        zingers = np.nonzero(frames[half:half + end - start] - median > level)
+        # list.append is atomic
+        corrections.append((start, zingers, median[zingers]))
+
+    _map(block, data, ncore)
+
+    counts = np.zeros(nproj, dtype=np.int64)
+    for start, zingers, values in corrections:
+        index = (zingers[0] + start,) + zingers[1:]
+        if np.issubdtype(data.dtype, np.integer):
+            values = np.rint(values)
+        data[index] = values
+        counts += np.bincount(index[0], minlength=nproj)
+    return counts
+
+
+class ZingerCounts(object):
+    """
+    Corrected pixels of each projection summed over the chunks of a run, for quality checks.
+    """
+
+    def __init__(self):
+        self.counts = None
+        self._lock = threading.Lock()
+
+    def add(self, counts):
+        with self._lock:
+            if self.counts is None:
+                self.counts = np.zeros(len(counts), dtype=np.int64)
+            self.counts += counts
+
+
+def bin_frames(data, level, rows=True):
+    """
+    Average blocks of power(2, level) columns, and rows, of each frame.
+
+    Parameters
+    ----------
+    data : ndarray
+        Frames of shape (n, rows, columns), of any data type.
+    level : int
+        Binning as power(2, level).
+    rows : bool
+        Bin the rows too, otherwise only the columns.
+
+    Returns
+    -------
+    ndarray
+        float32 binned frames, the rows and columns beyond a whole block are dropped (as tomopy.downsample).
+    """
+
+    f = int(np.power(2, level))
+    fr = f if rows else 1
+    n, nrows, ncol = data.shape[0], data.shape[1] // fr, data.shape[2] // f
+    blocks = data[:, :nrows * fr, :ncol * f].reshape(n, nrows, fr, ncol, f)
+
+    return blocks.mean(axis=(2, 4), dtype=np.float32)
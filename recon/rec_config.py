@@ -0,0 +1,384 @@
+"""
+Reconstruction parameters grouped in sections, in the same format as config/config.py.
+"""
+
+import sys
+import argparse
+import configparser
+from collections import OrderedDict
+
+import pipeline_lib
+
+
+NAME = "recon.conf"
+
+
+def restricted_float(x):
+
+    x = float(x)
+    if x < 0.0 or x >= 1.0:
+        raise argparse.ArgumentTypeError("%r not in range [0.0, 1.0]"%(x,))
+    return x
+
+
+def float_list(x):
+
+    try:
+        return [float(value) for value in x.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("%r is not a comma separated list of numbers" % (x,))
+
+
+def choice_list(choices):
+    """argparse type of a comma separated list of choices."""
+
+    def parse(x):
+        values = [value.strip() for value in x.split(',') if value.strip()]
+        for value in values:
+            if value not in choices:
+                raise argparse.ArgumentTypeError("%r not in %s" % (value, ', '.join(choices)))
+        return values
+
+    return parse
+
+
+SECTIONS = OrderedDict()
+
+SECTIONS['general'] = {
+    'config': {
+        'default': NAME,
+        'type': str,
+        'help': "File name of configuration",
+        'metavar': 'FILE'}}
+
+SECTIONS['file-reading'] = {
+    'nsino': {
+        'default': 0.5,
+        'type': restricted_float,
+        'help': "Location of the sinogram to reconstruct (0 top, 1 bottom): 0.5 (default 0.5)"},
+    'dimax': {
+        'default': False,
+        'help': "set when the data set is the projection file of a DIMAX proj/flat/dark triplet, e.g. sample_0153.h5 with the flat in sample_0154.h5 and the dark in sample_0155.h5",
+        'action': 'store_true'},
+    'flat-file': {
+        'dest': 'flat_file',
+        'default': None,
+        'type': str,
+        'help': "Data set whose flat/dark are used, e.g. white_0025.h5, or nearest for the data set of the same folder with good flats acquired closest to the scan (default none, the scan flats)"},
+    'flat-method': {
+        'dest': 'flat_method',
+        'default': 'mean',
+        'type': str,
+        'choices': ['mean', 'median'],
+        'help': "Average of the flat/dark frames (default mean)"},
+    'flat-zinger': {
+        'dest': 'flat_zinger',
+        'default': False,
+        'help': "set to remove the zingers of the flat frames before averaging",
+        'action': 'store_true'},
+    'flat-cache': {
+        'dest': 'flat_cache',
+        'default': False,
+        'help': "set to keep the averaged flat/dark of each data set in ~/.cache/recon/flat_dark for the next reconstructions",
+        'action': 'store_true'},
+    'zinger': {
+        'default': False,
+        'help': "set to remove the zingers of the projections: pixels brighter than the running median over --zinger-size projections by more than --zinger-level",
+        'action': 'store_true'},
+    'zinger-level': {
+        'dest': 'zinger_level',
+        'default': 800,
+        'type': float,
+        'help': "Zinger threshold (counts) of the projections, binned with --bin (default 800)"},
+    'zinger-size': {
+        'dest': 'zinger_size',
+        'default': 5,
+        'type': int,
+        'help': "Number of consecutive projections of the zinger running median (default 5)"},
+    'reverse': {
+        'default': False,
+        'help': "set when the data set was collected in reverse (180-0)",
+        'action': 'store_true'},
+    'missing': {
+        'default': False,
+        'help': "set to enable missing angle option. Must set start/end flags",
+        'action': 'store_true'},
+    'start': {
+        'default': 0,
+        'type': int,
+        'help': "Projection number of the first blocked view"},
+    'end': {
+        'default': 1,
+        'type': int,
+        'help': "Projection number of the last blocked view"}}
+
+SECTIONS['file-writing'] = {
+    'output': {
+        'default': 'tiff',
+        'type': str,
+        'choices': ['tiff', 'hdf5'],
+        'help': "Full reconstruction output: a tiff stack in *_full_rec/ or a single *_full_rec.h5 file with an /exchange/recon dataset (default tiff)"},
+    'compression': {
+        'default': None,
+        'type': str,
+        'choices': ['gzip', 'lzf', 'blosc', 'lz4'],
+        'help': "Lossless compression of the hdf5 output, blosc and lz4 need hdf5plugin (default none)"},
+    'dtype': {
+        'default': 'float32',
+        'type': str,
+        'choices': ['float32', 'uint16', 'uint8'],
+        'help': "Full reconstruction output data type; uint16/uint8 map the 0.1-99.9 percentile range of a few test slices to the integer range (default float32)"},
+    'levels': {
+        'default': 0,
+        'type': int,
+        'help': "Number of multi-resolution levels of the hdf5 output, /exchange/recon_k is binned by power(2, k) along all axes (default 0)"}}
+
+SECTIONS['reconstruction'] = {
+    'axis': {
+        'dest': 'rot_center',
+        'default': 0.0,
+        'type': float,
+        'help': "Rotation axis location (pixel): 1024.0 (default 1/2 image horizontal size)"},
+    'auto': {
+        'default': False,
+        'help': "set to use autocenter, when set --axis value is ignored",
+        'action': 'store_true'},
+    'center-metric': {
+        'default': None,
+        'type': str,
+        'choices': ['entropy'],
+        'help': "Image quality metric of a coarse to fine --auto center search (default none, tomopy.find_center_vo)"},
+    'axis-slope': {
+        'dest': 'rot_center_slope',
+        'default': 0.0,
+        'type': float,
+        'help': "Change of the rotation axis location per detector row for a tilted axis, --axis is the location at --nsino (default 0)"},
+    'tilt': {
+        'default': 0,
+        'type': int,
+        'help': "Number of sinograms, spread over the detector height, used by --auto to fit a tilted rotation axis (default 0, one sinogram at --nsino)"},
+    'bin': {
+        'dest': 'binning',
+        'default': 0,
+        'type': int,
+        'help': "Reconstruction binning factor as power(2, choice) (default 0, no binning)"},
+    'method': {
+        'dest': 'algorithm',
+        'default': 'gridrec',
+        'type': str,
+        'help': "Reconstruction algorithm: astrasirt, astracgls, gridrec, sirtfbp, fbp, sirt, cgls (default gridrec). gridrec and fbp pad the sinograms inside the ramp filter only and reconstruct the unpadded slices, fbp by direct backprojection (compiled with numba when installed), slower than gridrec; sirt and cgls are the CPU iterative methods on the same grid"},
+    'num-iter': {
+        'dest': 'num_iter',
+        'default': 100,
+        'type': int,
+        'help': "Number of SIRT iterations matched by the sirtfbp filter, the filters are cached in ~/.cache/recon/sirtfbp; maximum number of sirt/cgls iterations (default 100)"},
+    'iter-tol': {
+        'dest': 'iter_tol',
+        'default': 1e-2,
+        'type': float,
+        'help': "sirt/cgls stop when an iteration lowers the residual norm by less than iter-tol times its value (default 1e-2)"},
+    'warm-start': {
+        'dest': 'warm_start',
+        'default': 'fbp',
+        'type': str,
+        'choices': ['none', 'fbp', 'previous'],
+        'help': "sirt/cgls initial slices: none (zero), fbp, previous (the slices of the previous data set of a folder, e.g. in-situ time frames, read back from its float32 --type full output, or with --type dynamic the previous time frame; fbp for the first one) (default fbp)"},
+    'filter': {
+        'default': 'parzen',
+        'type': str,
+        'help': "Reconstruction filter: none, shepp, cosine, hann, hamming, ramlak, parzen, butterworth (default parzen)"},
+    'type': {
+        'dest': 'rec_type',
+        'default': 'slice',
+        'type': str,
+        'help': "Reconstruction type: full, slice, try, phase, preview, dynamic (default slice). try/phase: multiple reconsctruction of the same slice with different (rotation axis)/(alpha coefficients). preview: quick look mosaic of 3 orthogonal slices. dynamic: reconstruction (--method) of the time frames of a continuous rotation scan"},
+    'frame-length': {
+        'dest': 'frame_length',
+        'default': 0,
+        'type': int,
+        'help': "--type dynamic: number of projections of a time frame (default 0, the projections of 180 degrees)"},
+    'frame-overlap': {
+        'dest': 'frame_overlap',
+        'default': 0,
+        'type': int,
+        'help': "--type dynamic: number of projections shared by consecutive time frames, sliding window frames; with --method fbp, overlaps with a large common divisor with the frame length reuse more backprojections (default 0)"},
+    'preview-step': {
+        'dest': 'preview_step',
+        'default': 8,
+        'type': int,
+        'help': "Preview reads every preview-step-th projection (default 8)"},
+    'preview-format': {
+        'dest': 'preview_format',
+        'default': 'png',
+        'type': str,
+        'choices': ['png', 'tiff'],
+        'help': "Preview mosaic image format (default png)"},
+    'srs': {
+        'dest': 'center_search_width',
+        'default': 10,
+        'type': int,
+        'help': "+/- center search width (pixel): 10 (default 10). Search is in 0.5 pixel increments"},
+    'plot': {
+        'default': False,
+        'help': "set to plot try result",
+        'action': 'store_true'}}
+
+SECTIONS['phase-retrieval'] = {
+    'phase': {
+        'default': False,
+        'help': "set to use phase retrieval; when selected also set the phase retrieval paramenters: sdd, dps, alpha and energy",
+        'action': 'store_true'},
+    'alpha': {
+        'default': 1e-4,
+        'type': float,
+        'help': "Phase retrieval paramenter: alpha: 1e-4 (default 1e-4)"},
+    'phase-alphas': {
+        'dest': 'phase_alphas',
+        'default': None,
+        'type': float_list,
+        'help': "Alphas tried by --type phase: 1e-3,1e-2,1e-1 (default 1e-4 to 1)"},
+    'phase-distances': {
+        'dest': 'phase_distances',
+        'default': None,
+        'type': float_list,
+        'help': "Sample detector distances (mm) tried by --type phase, each with every alpha: 40,60,80 (default --sdd)"},
+    'sdd': {
+        'dest': 'sample_detector_distance',
+        'default': 60,
+        'type': float,
+        'help': "Phase retrieval paramenter: Sample detector distance (mm): 60 (default 60)"},
+    'dps': {
+        'dest': 'detector_pixel_size_x',
+        'default': 1.17,
+        'type': float,
+        'help': "Phase retrieval paramenter: Detector pixel size (microns): 1.17 (default 1.17) (5x: 1.17, 2x: 2.93)"},
+    'energy': {
+        'dest': 'monochromator_energy',
+        'default': 20,
+        'type': float,
+        'help': "Phase retrieval paramenter: X-ray energy (keV): 20 (default 20)"}}
+
+SECTIONS['stripe-removal'] = {
+    'stripe': {
+        'dest': 'stripe_methods',
+        'default': 'fw,sf',
+        'type': choice_list(['fw', 'ti', 'sf', 'ring', 'none']),
+        'help': "Ring removal stages, run in this order: fw (wavelet-FFT), ti (Titarenko), sf (smoothing filter) on the sinograms, ring on the reconstructed slices, none; the time of each stage is logged (default fw,sf)"},
+    'fw-level': {
+        'dest': 'fw_level',
+        'default': 7,
+        'type': int,
+        'help': "fw: number of wavelet decomposition levels (default 7)"},
+    'fw-wname': {
+        'dest': 'fw_wname',
+        'default': 'sym16',
+        'type': str,
+        'help': "fw: wavelet name (default sym16)"},
+    'fw-sigma': {
+        'dest': 'fw_sigma',
+        'default': 1.0,
+        'type': float,
+        'help': "fw: damping parameter in Fourier space (default 1)"},
+    'ti-alpha': {
+        'dest': 'ti_alpha',
+        'default': 1.5,
+        'type': float,
+        'help': "ti: damping factor (default 1.5)"},
+    'sf-size': {
+        'dest': 'sf_size',
+        'default': 150,
+        'type': int,
+        'help': "sf: size of the smoothing filter (default 150)"},
+    'ring-width': {
+        'dest': 'ring_width',
+        'default': 30,
+        'type': int,
+        'help': "ring: maximum width of the rings (pixel) removed from the reconstructed slices (default 30)"}}
+
+SECTIONS['performance'] = {
+    'mem-budget': {
+        'default': None,
+        'type': pipeline_lib.parse_size,
+        'help': "Memory available to a full reconstruction, used to set the chunk size: 48G (default none, 32 sinograms per chunk)"},
+    'nworkers': {
+        'default': 1,
+        'type': int,
+        'help': "Number of chunks reconstructed in parallel by a full reconstruction: 1 (default 1)"}}
+
+RECON_PARAMS = ('file-reading', 'file-writing', 'reconstruction', 'phase-retrieval', 'stripe-removal', 'performance')
+
+
+def get_config_name():
+    """Get the command line --config option."""
+    name = NAME
+    for i, arg in enumerate(sys.argv):
+        if arg.startswith('--config'):
+            if arg == '--config':
+                return sys.argv[i + 1]
+            else:
+                name = sys.argv[i].split('--config')[1]
+                if name[0] == '=':
+                    name = name[1:]
+                return name
+
+    return name
+
+
+def config_to_list(config_name=NAME):
+    """
+    Read arguments from config file and convert them to a list of keys and
+    values as sys.argv does when they are specified on the command line.
+    *config_name* is the file name of the config file.
+    """
+    result = []
+    config = configparser.ConfigParser()
+
+    if not config.read([config_name]):
+        return []
+
+    for section in SECTIONS:
+        for name, opts in ((n, o) for n, o in SECTIONS[section].items() if config.has_option(section, n)):
+            value = config.get(section, name)
+
+            if value != '' and value != 'None':
+                action = opts.get('action', None)
+
+                if action == 'store_true' and value == 'True':
+                    # Only the key is on the command line for this action
+                    result.append('--{}'.format(name))
+
+                if not action == 'store_true':
+                    result.append('--{}={}'.format(name, value))
+
+    return result
+
+
+def parse_args(parser, arg=(), config_name=NAME, preset=None):
+    """
+    Parse the recon.conf options then arg, with the preset entries (e.g. of a per-user
+    rec.py) as parser defaults: recon.conf and the command line override them.
+    """
+    if preset:
+        parser.set_defaults(**preset)
+    return parser.parse_args(config_to_list(config_name) + list(arg))
+
+
+class Params(object):
+    def __init__(self, sections=()):
+        self.sections = sections + ('general', )
+
+    def add_parser_args(self, parser):
+        for section in self.sections:
+            for name in sorted(SECTIONS[section]):
+                opts = SECTIONS[section][name]
+                parser.add_argument('--{}'.format(name), **opts)
+
+    def add_arguments(self, parser):
+        self.add_parser_args(parser)
+        return parser
+
+    def get_defaults(self):
+        parser = argparse.ArgumentParser()
+        self.add_arguments(parser)
+
+        return parser.parse_args('')
@@ -0,0 +1,1474 @@
+"""
+Reconstruction core shared by recon, find_center and the per-user rec.py presets.
+"""
+
+import os
+import json
+import argparse
+import collections
+import pathlib
+from datetime import datetime
+
+import h5py
+import tomopy
+import dxchange
+import dxchange.reader as dxreader
+
+import numpy as np
+
+import matplotlib.pylab as pl
+import matplotlib.widgets as wdg
+
+import log_lib
+import center_lib
+import dimax_lib
+import dyn_lib
+import fbp_lib
+import iter_lib
+import flat_lib
+import phase_lib
+import pipeline_lib
+import prep_lib
+import writer_lib
+import rec_config
+import sirtfbp_lib
+import stripe_lib
+
+
+variableDict = {'fname': 'data.h5',
+        'rec_dir' : '/local/data',
+        'nsino': 0.5,
+        'algorithm': 'gridrec',
+        'filter' : 'parzen',
+        'num_iter' : 100,                      # SIRT iterations matched by the sirtfbp filter, maximum sirt/cgls iterations
+        'iter_tol' : 1e-2,                     # sirt/cgls stop when an iteration lowers the residual by less than iter_tol
+        'warm_start' : 'fbp',                  # sirt/cgls initial slices: none, fbp, previous (time frame)
+        'previous_fname' : None,               # data set reconstructed before fname by a folder run, set by ReconPipeline
+        'binning': 0,
+        'rot_center': 1024,
+        'rot_center_slope': 0.0,               # Change of rot_center per detector row, rot_center is the center at row nsino
+        'tilt': 0,                             # Number of sinograms used by autocentering to fit rot_center_slope
+        'rec_type': 'slice',
+        'center_search_width': 10,
+        'alpha': 1e-2,                         # Phase retrieval coeff.     
+        'sample_detector_distance': 40,        # Propagation distance of the wavefront in mm
+        'detector_pixel_size_x' : 1.17,        # Detector pixel size in microns (5x: 1.17, 2x: 2.93)
+        'monochromator_energy' : 25,           # Energy of incident wave in keV                   
+        'zinger' : False,                      # Remove the zingers of the projections
+        'zinger_level' : 800,                  # Zinger level for projections
+        'zinger_size' : 5,                     # Number of projections of the zinger running median
+        'zinger_level_w' : 1000,               # Zinger level for white
+        'dimax' : False,                       # fname is the projection file of a DIMAX proj/flat/dark triplet
+        'flat_file' : None,                    # Data set with the flat/dark to use, None for fname, 'nearest' for the closest good one
+        'flat_method' : 'mean',                # Average of the flat/dark frames: mean, median
+        'flat_zinger' : False,                 # Remove the zingers (zinger_level_w) of the flats before averaging
+        'flat_cache' : False,                  # Keep the averaged flat/dark in flat_lib.CACHE_DIR for the next runs
+        'reverse' : False,                     # True for 180-0 data set
+        'missing' : False,                     # True to drop the projections from start to end
+        'start' : 0,                           # First missing projection
+        'end' : 1,                             # Last missing projection
+        'auto' : False,                        # True to use autocentering
+        'center_metric' : None,                # Image quality metric used by autocentering, None for tomopy.find_center_vo
+        'phase' :  False,                       # Use phase retrival    
+        'phase_minus_log' : True,              # Take -log of the data after phase retrieval
+        'frame_length' : 0,                    # Projections per time frame of rec_dynamic, 0 for 180 degrees
+        'frame_overlap' : 0,                   # Projections shared by consecutive time frames
+        'phase_alphas' : None,                 # Alphas tried by try_phase, None for 1e-4 to 1
+        'phase_distances' : None,              # Sample detector distances (mm) tried by try_phase, None for sample_detector_distance
+        'zero_dark' : False,                   # Ignore the dark images
+        'circ_mask' : True,                    # Mask each reconstructed slice with a circle
+        'stripe_methods' : ['fw', 'sf'],       # Ring removal stages in order: fw, ti, sf on the sinograms, ring on the slices
+        'fw_level' : 7,                        # remove_stripe_fw decomposition levels
+        'fw_wname' : 'sym16',                  # remove_stripe_fw wavelet
+        'fw_sigma' : 1,                        # remove_stripe_fw damping
+        'ti_alpha' : 1.5,                      # remove_stripe_ti damping
+        'sf_size' : 150,                       # remove_stripe_sf filter size
+        'ring_width' : 30,                     # remove_ring maximum ring width (pixel)
+        'logs_home' : '.',
+        'plot' : False,
+        'preview_step' : 8,                    # Preview reconstructions read every preview_step-th projection
+        'preview_format' : 'png',              # Preview mosaic image format: png, tiff
+        'output' : 'tiff',                     # rec_full output: tiff stack or a single hdf5 file
+        'compression' : None,                  # Lossless compression of the hdf5 output: gzip, lzf, blosc, lz4
+        'levels' : 0,                          # Number of multi-resolution levels of the hdf5 output
+        'dtype' : 'float32',                   # rec_full output data type: float32, uint16, uint8
+        'nworkers' : 1,                        # Number of chunks reconstructed at the same time by rec_full
+        'mem_budget' : None                    # Memory (bytes) available to rec_full, None for 32 sinograms per chunk
+        }
+
+
+class slider():
+    def __init__(self, data, axis):
+        self.data = data
+        self.axis = axis
+
+        ax = pl.subplot(111)
+        pl.subplots_adjust(left=0.25, bottom=0.25)
+
+        self.frame = 0
+        self.l = pl.imshow(self.data[self.frame,:,:], cmap='gist_gray') 
+
+        axcolor = 'lightgoldenrodyellow'
+        axframe = pl.axes([0.25, 0.1, 0.65, 0.03])
+        self.sframe = wdg.Slider(axframe, 'Frame', 0, self.data.shape[0]-1, valfmt='%0.0f')
+        self.sframe.on_changed(self.update)
+
+        pl.show()
+
+    def update(self, val):
+        self.frame = int(np.around(self.sframe.val))
+        self.l.set_data(self.data[self.frame,:,:])
+        log_lib.info('%f' % self.axis[self.frame])
+
+
+def file_base_name(file_name):
+    if '.' in file_name:
+        separator_index = file_name.index('.')
+        base_name = file_name[:separator_index]
+        return base_name
+    else:
+        return file_name
+
+
+def path_base_name(path):
+    file_name = os.path.basename(path)
+    return file_base_name(file_name)
+
+
+def get_dx_dims(fname, dataset):
+    """
+    Read array size of a specific group of Data Exchange file.
+
+    Parameters
+    ----------
+    fname : str
+        String defining the path of file or file name.
+    dataset : str
+        Path to the dataset inside hdf5 file where data is located.
+
+    Returns
+    -------
+    ndarray
+        Data set size.
+    """
+
+    grp = '/'.join(['exchange', dataset])
+
+    with h5py.File(fname, "r") as f:
+        try:
+            data = f[grp]
+        except KeyError:
+            return None
+
+        shape = data.shape
+
+    return shape
+
+
+def get_dx_itemsize(fname, dataset):
+    """
+    Read the size in bytes of one element of a specific group of Data Exchange file.
+    """
+
+    grp = '/'.join(['exchange', dataset])
+
+    with h5py.File(fname, "r") as f:
+        try:
+            data = f[grp]
+        except KeyError:
+            return None
+
+        itemsize = data.dtype.itemsize
+
+    return itemsize
+
+
+def read_rot_centers(fname):
+
+    try:
+        with open(fname) as json_file:
+            json_string = json_file.read()
+            dictionary = json.loads(json_string)
+
+        return collections.OrderedDict(sorted(dictionary.items()))
+
+    except Exception as error: 
+        log_lib.error("ERROR: the json file containing the rotation axis locations is missing")
+        log_lib.error("ERROR: run: python find_center.py to create one first")
+        exit()
+
+
+def patch_projection(data, miss_angles):
+
+    fdatanew = np.fft.fft(data,axis=2)
+
+    w = int((miss_angles[1]-miss_angles[0]) * 0.3)
+
+
+    fdatanew[miss_angles[0]:miss_angles[0]+w,:,:] = np.fft.fft(data[miss_angles[0]-1,:,:],axis=1)
+    fdatanew[miss_angles[0]:miss_angles[0]+w,:,:] *= np.reshape(np.cos(np.pi/2*np.linspace(0,1,w)),[w,1,1])
+
+    fdatanew[miss_angles[1]-w:miss_angles[1],:,:] = np.fft.fft(data[miss_angles[1]+1,:,:],axis=1)
+    fdatanew[miss_angles[1]-w:miss_angles[1],:,:] *= np.reshape(np.sin(np.pi/2*np.linspace(0,1,w)),[w,1,1])
+
+    fdatanew[miss_angles[0]+w:miss_angles[1]-w,:,:] = 0
+    # log_lib.warning("  *** %d, %d, %d " % (datanew.shape[0], datanew.shape[1], datanew.shape[2]))
+
+    log_lib.warning("  *** patch_projection")
+    slider(np.log(np.abs(fdatanew.swapaxes(0,1))), axis=0)
+    a = np.real(np.fft.ifft(fdatanew,axis=2))
+    b = np.imag(np.fft.ifft(fdatanew,axis=2))
+    print(a.shape)
+    slider(a.swapaxes(0,1), axis=0)
+    slider(b.swapaxes(0,1), axis=0)
+    return np.real(np.fft.ifft(fdatanew,axis=2))
+
+def read_theta(fname):
+    """
+    Projection angles in radians, 0-180 deg when the data set has no /exchange/theta (as dxchange.read_aps_32id).
+    """
+
+    theta = dxreader.read_hdf5(fname, 'exchange/theta')
+    if theta is None:
+        theta_size = get_dx_dims(fname, 'data')[0]
+        log_lib.warning('  *** generating [0-180] deg angles for missing exchange/theta')
+        return np.linspace(0., np.pi, theta_size)
+    return theta * np.pi / 180.
+
+
+def flat_file(variableDict):
+    """
+    Data set whose flat and dark are used to normalize variableDict['fname'].
+
+    variableDict['flat_file'] is None for the data set itself, nearest for the data set of
+    the same folder with good flats acquired closest to it, or a file name.
+    """
+
+    if variableDict['flat_file'] is None:
+        return variableDict['fname']
+    if variableDict['flat_file'] == 'nearest':
+        top, name = os.path.split(os.path.abspath(variableDict['fname']))
+        nearest = flat_dark_cache(variableDict, top).nearest(name, variableDict['flat_method'], flat_zinger_level(variableDict))
+        if nearest is None:
+            log_lib.warning("  *** no data set with good flats in %s" % top)
+            return variableDict['fname']
+        return os.path.join(top, nearest)
+    return variableDict['flat_file']
+
+
+def flat_dark_cache(variableDict, top):
+    """
+    FlatDarkCache of a data set folder, saved in flat_lib.CACHE_DIR when variableDict['flat_cache'].
+    """
+
+    return flat_lib.FlatDarkCache(top, flat_lib.CACHE_DIR if variableDict['flat_cache'] else None)
+
+
+def flat_zinger_level(variableDict):
+
+    return variableDict['zinger_level_w'] if variableDict['flat_zinger'] else None
+
+
+def custom_flat(variableDict):
+    """
+    True when the flat and dark are not the plain average of the data set ones.
+    """
+
+    return variableDict['dimax'] or variableDict['flat_file'] is not None or variableDict['flat_method'] != 'mean' or variableDict['flat_zinger']
+
+
+def read_flat_dark(variableDict):
+    """
+    Read flat, dark and theta of a data set once for the whole detector.
+
+    The frames of the flat data set (see flat_file) are averaged, or read from the flat_lib
+    cache when variableDict['flat_cache'] and saved there the first time.
+
+    Parameters
+    ----------
+    variableDict : dict
+        Reconstruction parameters, fname is the data set to read.
+
+    Returns
+    -------
+    flat, dark : ndarray
+        Averaged flat and dark frames as float32 arrays of shape (1, rows, columns).
+    theta : ndarray
+        Projection angles in radians.
+    """
+
+    if variableDict['dimax']:
+        # the flat and dark files of the triplet, each read once and averaged
+        flat, dark = dimax_lib.read_flat_dark(variableDict['fname'])
+        log_lib.info("  *** flat/dark: %s, %s" % dimax_lib.flat_dark(variableDict['fname']))
+        flat = flat_lib.average(flat, variableDict['flat_method'], flat_zinger_level(variableDict))
+        dark = flat_lib.average(dark, variableDict['flat_method'])
+        return flat, dark, read_theta(variableDict['fname'])
+
+    source = flat_file(variableDict)
+    top, name = os.path.split(os.path.abspath(source))
+    flat, dark, signal = flat_dark_cache(variableDict, top).get(name, variableDict['flat_method'], flat_zinger_level(variableDict))
+    if flat is None:
+        raise ValueError("no flat in %s" % source)
+    if source != variableDict['fname']:
+        log_lib.info("  *** flat/dark: %s" % source)
+
+    return flat, dark, read_theta(variableDict['fname'])
+
+
+def read_raw(variableDict, sino):
+    """
+    Read the projections, flat, dark and theta of a sinogram range, as dxchange.read_aps_32id,
+    with the flat and dark of read_flat_dark() when custom_flat().
+    """
+
+    if variableDict['dimax']:
+        # only the projections of the projection file are read
+        proj, flat, dark, theta = dimax_lib.read(variableDict['fname'], 'exchange/data', sino), None, None, read_theta(variableDict['fname'])
+    else:
+        proj, flat, dark, theta = dxchange.read_aps_32id(variableDict['fname'], sino=sino)
+    if custom_flat(variableDict):
+        flat, dark = (frame[:, sino[0]:sino[1], :] for frame in read_flat_dark(variableDict)[:2])
+    return proj, flat, dark, theta
+
+
+def read_projection(variableDict, sino, step=32, proj_step=1):
+    """
+    Read the projections of a sinogram range, binned as set by variableDict['binning'].
+
+    With binning the projections are read step at a time and binned right away, so
+    that the chunk is only in memory at the binned size. proj_step > 1 reads every
+    proj_step-th projection only (an HDF5 strided hyperslab). DIMAX projection files are
+    read from the files kept open by dimax_lib.
+    """
+
+    if variableDict['binning'] == 0 and proj_step == 1:
+        if variableDict['dimax']:
+            return dimax_lib.read(variableDict['fname'], 'exchange/data', sino)
+        return dxreader.read_hdf5(variableDict['fname'], '/exchange/data', slc=(None, sino))
+
+    f = 2 ** variableDict['binning']
+    with dimax_lib.pool.open(variableDict['fname']) if variableDict['dimax'] else h5py.File(variableDict['fname'], 'r') as h5:
+        dset = h5['/exchange/data']
+        nproj = len(range(0, dset.shape[0], proj_step))
+        proj = np.empty((nproj, (sino[1] - sino[0]) // f, dset.shape[2] // f), dtype=np.float32)
+        for start in range(0, nproj, step):
+            frames = dset[start * proj_step:(start + step) * proj_step:proj_step, sino[0]:sino[1], :]
+            proj[start:start + step] = prep_lib.bin_frames(frames, variableDict['binning'])
+
+    return proj
+
+
+def row_centers(variableDict, sino, nslices):
+    """
+    Rotation axis location (unbinned pixel) of each binned slice of a chunk for a tilted axis.
+    """
+
+    ref_row = int(get_dx_dims(variableDict['fname'], 'data')[1] * variableDict['nsino'])
+    binning = int(np.power(2, variableDict['binning']))
+    # center of each group of binned rows
+    rows = sino[0] + np.arange(nslices) * binning + (binning - 1) / 2.0
+
+    return variableDict['rot_center'] + variableDict['rot_center_slope'] * (rows - ref_row)
+
+
+def astra_shift(data, rot_center):
+
+    # astra reconstructs around the middle column: move the rotation axis there
+    shift = np.broadcast_to(np.int_(data.shape[2]/2 - np.asarray(rot_center) + .5), (data.shape[1],))
+    if np.all(shift == shift[0]):
+        return np.roll(data, shift[0], axis=2)
+    for i in range(data.shape[1]):
+        data[:, i, :] = np.roll(data[:, i, :], shift[i], axis=1)
+    return data
+
+
+def preprocess(variableDict, sino, proj=None, flat=None, dark=None, theta=None, binned=False, zingers=None):
+    """
+    Read (when proj is None), normalize and remove the stripes of a sinogram range.
+
+    binned is True when proj was binned at read time (read_projection): flat and dark are
+    then binned the same way and the preprocessing runs on the binned data. The zinger
+    counts of the chunk are added to zingers (a prep_lib.ZingerCounts) when given.
+
+    Returns
+    -------
+    data : ndarray
+        Normalized projections.
+    theta : ndarray
+        Projection angles in radians.
+    pixel_size : float
+        Pixel size (microns) of data.
+    """
+
+    if proj is None:
+        # Read APS 32-BM raw data.
+        proj, flat, dark, theta = read_raw(variableDict, sino)
+    else:
+        # flat and dark from read_flat_dark() cover the whole detector
+        flat = flat[:, sino[0]:sino[1], :]
+        dark = dark[:, sino[0]:sino[1], :]
+        
+    if variableDict['reverse']:
+        step_size = (theta[1] - theta[0]) 
+        theta_size = dxreader.read_dx_dims(variableDict['fname'], 'data')[0]
+        theta = np.linspace(np.pi , (0+step_size), theta_size)    # zinger_removal
+        log_lib.warning("  *** overwrite theta")
+
+    # old missing projection handling
+    if variableDict['missing']:
+        miss_angles = [variableDict['start'], variableDict['end']]
+        
+        log_lib.warning("  *** old missing angle handling")
+        proj = np.concatenate((proj[0:miss_angles[0],:,:], proj[miss_angles[1]+1:-1,:,:]), axis=0)
+        theta = np.concatenate((theta[0:miss_angles[0]], theta[miss_angles[1]+1:-1]))
+
+    # new missing projection handling
+    # if variableDict['missing']:
+    #     log_lib.warning("  *** new missing angle handling")
+    #     miss_angles = [variableDict['start'], variableDict['end']]
+    #     data = patch_projection(data, miss_angles)
+
+
+    # zinger_removal
+    if variableDict['zinger']:
+        with log_lib.timed('zinger removal'):
+            remove_zingers(variableDict, proj, sino, zingers)
+
+    pixel_size = variableDict['detector_pixel_size_x']
+    if binned:
+        flat = prep_lib.bin_frames(flat, variableDict['binning'])
+        dark = prep_lib.bin_frames(dark, variableDict['binning'])
+        pixel_size = pixel_size * np.power(2, variableDict['binning'])
+
+    # e.g. for the 2017-07 van Loon samples
+    if variableDict['zero_dark']:
+        dark = np.zeros_like(dark)
+
+    # normalize
+    with log_lib.timed('normalize'):
+        data = prep_lib.normalize(proj, flat, dark)
+
+    data = remove_stripes(variableDict, data)
+
+    log_lib.info("  *** raw data: %s" % variableDict['fname'])
+
+    return data, theta, pixel_size
+
+
+def remove_zingers(variableDict, proj, sino, zingers=None):
+    """
+    Remove the zingers of raw projections in place, log the corrected pixel counts and add them to zingers.
+
+    Returns
+    -------
+    ndarray
+        Number of corrected pixels of each projection.
+    """
+
+    counts = prep_lib.remove_zingers(proj, variableDict['zinger_level'], variableDict['zinger_size'])
+    if counts.any():
+        worst = np.argsort(counts)[::-1][:3]
+        log_lib.info("  *** zingers in rows %s: %d pixels in %d projections, most in %s" % (
+            list(sino), counts.sum(), np.count_nonzero(counts), ', '.join('%d (%d)' % (p, counts[p]) for p in worst if counts[p])))
+    else:
+        log_lib.info("  *** zingers in rows %s: none" % list(sino))
+    if zingers is not None:
+        zingers.add(counts)
+    return counts
+
+
+def save_zinger_counts(writer, zingers):
+    """
+    Save the zinger counts of each projection over a run with its reconstructions: /exchange/zinger_counts
+    of the hdf5 output, zinger_counts.txt next to the tiff stack.
+    """
+
+    if zingers is None or zingers.counts is None:
+        return
+    counts = zingers.counts
+    worst = np.argsort(counts)[::-1][:3]
+    log_lib.info("  *** zingers: %d pixels in %d projections, most in %s" % (
+        counts.sum(), np.count_nonzero(counts), ', '.join('%d (%d)' % (p, counts[p]) for p in worst if counts[p]) or 'none'))
+    writer.add_dataset('/exchange/zinger_counts', counts)
+
+
+def remove_stripes(variableDict, data):
+    """
+    Run the sinogram stages of the stripe removal chain variableDict['stripe_methods'] in order, each timed in the log.
+    """
+
+    for method in variableDict['stripe_methods']:
+        if method not in stripe_lib.SINOGRAM_STAGES:
+            continue
+        with log_lib.timed('stripe removal (%s)' % method):
+            if method == 'fw':
+                data = stripe_lib.remove_stripe_fw(data, level=variableDict['fw_level'], wname=variableDict['fw_wname'], sigma=variableDict['fw_sigma'], pad=True)
+            elif method == 'ti':
+                data = stripe_lib.remove_stripe_ti(data, alpha=variableDict['ti_alpha'])
+            else:
+                data = stripe_lib.remove_stripe_sf(data, size=variableDict['sf_size'])
+    return data
+
+
+def minus_log(variableDict, data):
+    """
+    -log, skipped after phase retrieval unless phase_minus_log, then nan, inf and negative values cleanup in one pass.
+    """
+
+    if (variableDict['phase'] == False) or variableDict['phase_minus_log']:
+        return prep_lib.minus_log(data)
+    return prep_lib.remove_invalid(data)
+
+
+# methods of fbp_lib and iter_lib, backprojecting only the pixels inside the circular mask
+DIRECT = ('fbp',) + iter_lib.METHODS
+# methods reconstructed without padding on the detector grid, gridrec after the fbp_lib filter
+UNPADDED = ('gridrec',) + DIRECT
+
+def read_previous(variableDict, sino, shape):
+    """
+    Slices of shape shape of the sinogram range sino in the full reconstruction of
+    variableDict['previous_fname'], read back from its output files; None when there
+    is no float32 reconstruction of these slices.
+    """
+
+    if variableDict['previous_fname'] is None:
+        return None
+    fname = full_rec_name(dict(variableDict, fname=variableDict['previous_fname']))
+    strt = int(sino[0] / np.power(2, float(variableDict['binning'])))
+    try:
+        if variableDict['output'] == 'hdf5':
+            fname = os.path.dirname(fname) + '.h5'
+            with h5py.File(fname, 'r') as h5:
+                rec = h5['/exchange/recon'][strt:strt + shape[0]]
+        else:
+            rec = np.stack([dxreader.read_tiff('%s_%05d.tiff' % (fname, i)) for i in range(strt, strt + shape[0])])
+    except (IOError, OSError, KeyError) as error:
+        log_lib.warning("  *** no previous slices in %s: %s" % (fname, error))
+        return None
+    if rec.shape != tuple(shape) or rec.dtype != np.float32:
+        log_lib.warning("  *** previous slices of %s are %s %s, not float32 %s" % (fname, rec.dtype, rec.shape, tuple(shape)))
+        return None
+    return rec
+
+
+def rec_iterative(variableDict, sino, data, theta, rot_center, mask_ratio=None, init=None):
+    """
+    CPU SIRT/CGLS reconstruction started from init (e.g. the previous time frame) or from
+    variableDict['warm_start']: none (0), fbp, or previous (the slices of the same rows of
+    the previous data set, read back from its float32 output; fbp for the first one).
+    """
+
+    if init is None and variableDict['warm_start'] == 'previous':
+        init = read_previous(variableDict, sino, (data.shape[1], data.shape[2], data.shape[2]))
+    if init is None and variableDict['warm_start'] != 'none':
+        with log_lib.timed('warm start (fbp)'):
+            init = fbp_lib.recon(data, theta, rot_center, filter_name=variableDict['filter'], mask_ratio=mask_ratio)
+
+    with log_lib.timed('reconstruction (%s)' % variableDict['algorithm']):
+        rec, niter = iter_lib.recon(data, theta, rot_center, variableDict['algorithm'], init, variableDict['num_iter'], variableDict['iter_tol'], mask_ratio)
+    log_lib.info("  *** %s: %d iterations" % (variableDict['algorithm'], niter))
+    return rec
+
+
+def rec_geometry(variableDict, sino, data, binned=False):
+    """
+    Downsample (unless binned) preprocessed sinograms and return them with the rotation center of the (binned) slices.
+    """
+
+    rot_center = variableDict['rot_center'] / np.power(2, float(variableDict['binning']))
+    log_lib.info("  *** rotation center: %f" % rot_center)
+    if not binned:
+        data = tomopy.downsample(data, level=variableDict['binning']) 
+        data = tomopy.downsample(data, level=variableDict['binning'], axis=1)
+
+    if variableDict['rot_center_slope'] != 0:
+        # tilted axis: one center per (binned) slice of the chunk
+        rot_center = row_centers(variableDict, sino, data.shape[1]) / np.power(2, float(variableDict['binning']))
+        log_lib.info("  *** rotation center from %f to %f" % (rot_center[0], rot_center[-1]))
+
+    return data, rot_center
+
+
+def pad_sinogram(data):
+    """
+    Sinograms padded by edge replication to 3N/2 columns, the data starts at column N//4.
+    """
+
+    N = data.shape[2]
+    data_pad = np.zeros([data.shape[0],data.shape[1],3*N//2],dtype = "float32")
+    data_pad[:,:,N//4:5*N//4] = data
+    data_pad[:,:,0:N//4] = np.reshape(data[:,:,0],[data.shape[0],data.shape[1],1])
+    data_pad[:,:,5*N//4:] = np.reshape(data[:,:,-1],[data.shape[0],data.shape[1],1])
+    return data_pad
+
+
+def rec_sinogram(variableDict, sino, data, theta, binned=False, init=None):
+    """
+    Downsample (unless binned), pad (except UNPADDED methods) and reconstruct preprocessed (-log) sinograms, then crop and mask the slices.
+    init is the initial slices of sirt/cgls, see rec_iterative().
+    """
+
+    data, rot_center = rec_geometry(variableDict, sino, data, binned)
+
+    # Reconstruct object.
+    log_lib.info("  *** algorithm: %s" % variableDict['algorithm'])
+    if variableDict['algorithm'] in UNPADDED:
+        # padded inside the filter FFT only, reconstructed on the N x N grid
+        mask_ratio = 0.95 if variableDict['circ_mask'] else None
+        if variableDict['algorithm'] == 'gridrec':
+            with log_lib.timed('reconstruction (gridrec)'):
+                rec = rec_gridrec(variableDict, data, theta, rot_center)
+        elif variableDict['algorithm'] == 'fbp':
+            with log_lib.timed('reconstruction (fbp)'):
+                rec = fbp_lib.recon(data, theta, rot_center, filter_name=variableDict['filter'], mask_ratio=mask_ratio)
+        else:
+            rec = rec_iterative(variableDict, sino, data, theta, rot_center, mask_ratio, init)
+        if mask_ratio is not None and variableDict['algorithm'] in DIRECT:
+            # the (back)projections only visit the pixels inside the mask
+            npix = fbp_lib.mask_pixels(rec.shape[2], mask_ratio).size
+            log_lib.info("  *** %s: %d of %d pixels inside the mask, %.0f%% of the backprojection skipped" % (variableDict['algorithm'], npix, rec[0].size, 100.0 * (1 - npix / float(rec[0].size))))
+    else:
+        # padding 
+        N = data.shape[2]
+        data = pad_sinogram(data)
+        rot_center = rot_center + N//4
+
+        with log_lib.timed('reconstruction (%s)' % variableDict['algorithm']):
+            rec = _recon(variableDict, data, theta, rot_center)
+
+        rec = rec[:,N//4:5*N//4,N//4:5*N//4]
+
+    if 'ring' in variableDict['stripe_methods']:
+        with log_lib.timed('ring removal'):
+            rec = stripe_lib.remove_ring(rec, rwidth=variableDict['ring_width'])
+
+    # Mask each reconstructed slice with a circle, the DIRECT methods only reconstructed inside.
+    if variableDict['circ_mask'] and variableDict['algorithm'] not in DIRECT:
+        with log_lib.timed('circular mask (after %s, no reconstruction skipped)' % variableDict['algorithm']):
+            rec = tomopy.circ_mask(rec, axis=0, ratio=0.95)
+    return rec
+
+
+def gridrec_filter(variableDict, data):
+    """
+    Ramp filtered sinograms for gridrec with filter_name='none', padded inside the fbp_lib filter FFT only.
+    """
+
+    if variableDict['filter'] == 'none':
+        return data
+    return fbp_lib.filter_sinogram(data, variableDict['filter'], scale=1)
+
+
+def rec_gridrec(variableDict, data, theta, rot_center, filtered=False):
+    """
+    gridrec of the N wide sinograms: the ramp filter is applied once by fbp_lib (unless
+    filtered), with the edge padding inside its FFT only, and gridrec backprojects without a filter.
+    """
+
+    if not filtered:
+        data = gridrec_filter(variableDict, data)
+    return tomopy.recon(data, theta, center=rot_center, algorithm='gridrec', filter_name='none')
+
+
+def _recon(variableDict, data, theta, rot_center):
+    # reconstruction of the padded sinograms with the selected algorithm
+    if variableDict['algorithm'] == 'astrasirt':
+        extra_options ={'MinConstraint':0}
+        options = {'proj_type':'cuda', 'method':'SIRT_CUDA', 'num_iter':200, 'extra_options':extra_options}
+        data = astra_shift(data, rot_center)
+        rec = tomopy.recon(data, theta, algorithm=tomopy.astra, options=options)
+    elif variableDict['algorithm'] == 'astracgls':
+        extra_options ={'MinConstraint':0}
+        options = {'proj_type':'cuda', 'method':'CGLS_CUDA', 'num_iter':15, 'extra_options':extra_options}
+        data = astra_shift(data, rot_center)
+        rec = tomopy.recon(data, theta, algorithm=tomopy.astra, options=options)
+    elif variableDict['algorithm'] == 'sirtfbp':
+        # gridrec with the SIRT-FBP filter of this geometry, computed once and cached
+        tomopy_filter = sirtfbp_lib.get_filter(data.shape[2], theta, variableDict['num_iter'])
+        rec = tomopy.recon(data, theta, center=rot_center, algorithm='gridrec', filter_name='custom2d', filter_par=tomopy_filter)
+    else:        
+        rec = tomopy.recon(data, theta, center=rot_center, algorithm=variableDict['algorithm'], filter_name=variableDict['filter'])
+    return rec
+
+
+def prepare(variableDict, sino, proj=None, flat=None, dark=None, theta=None, binned=False, zingers=None):
+    """
+    Preprocess, retrieve the phase and take the -log of a sinogram range, see reconstruct().
+
+    Returns
+    -------
+    data : ndarray
+        -log projections.
+    theta : ndarray
+        Projection angles in radians.
+    """
+
+    data, theta, pixel_size = preprocess(variableDict, sino, proj, flat, dark, theta, binned, zingers)
+
+    # phase retrieval
+    if (variableDict['phase']):
+        with log_lib.timed('phase retrieval'):
+            data = phase_lib.retrieve_phase(data,pixel_size=(pixel_size*1e-4),dist=(variableDict['sample_detector_distance']/10.0),energy=variableDict['monochromator_energy'], alpha=variableDict['alpha'])
+
+    with log_lib.timed('minus log'):
+        data = minus_log(variableDict, data)
+
+    return data, theta
+
+
+def reconstruct(variableDict, sino, proj=None, flat=None, dark=None, theta=None, binned=False, zingers=None):
+    """
+    Preprocess and reconstruct a sinogram range.
+
+    proj, flat, dark and theta are read from variableDict['fname'] when proj is None,
+    binned is True when proj was binned at read time, zingers collects the zinger counts
+    (see preprocess).
+    """
+
+    data, theta = prepare(variableDict, sino, proj, flat, dark, theta, binned, zingers)
+    return rec_sinogram(variableDict, sino, data, theta, binned)
+
+
+def phase_pad_size(dim, variableDict):
+    """
+    Size of a projection axis once padded by phase_lib.retrieve_phase (as tomopy.prep.phase.retrieve_phase(pad=True)).
+    """
+
+    # same units as retrieve_phase: cm and keV
+    pixel_size = variableDict['detector_pixel_size_x'] * 1e-4
+    dist = variableDict['sample_detector_distance'] / 10.0
+
+    return dim + 2 * phase_lib.pad_width(dim, pixel_size, variableDict['monochromator_energy'], dist)
+
+
+def sino_per_chunk(variableDict, data_shape, images=0):
+    """
+    Largest number of sinograms per chunk for which rec_full stays within variableDict['mem_budget'].
+
+    The estimate counts the chunks held by the pipeline and writer queues, the raw (or read time
+    binned) data, the float32 copies made by the preprocessing, the phase retrieval padding (one padded projection per
+    core), the 3N/2 padded sinograms and the padded reconstruction (N wide for the UNPADDED methods)
+    of every worker, plus images N x N float32 slices per row and worker (the frame blocks of
+    rec_dynamic, see dyn_lib.images).
+    """
+
+    nproj, nrows, ncol = data_shape
+    itemsize = get_dx_itemsize(variableDict['fname'], 'data')
+    binning = np.power(2, int(variableDict['binning']))
+    nworkers = max(1, int(variableDict['nworkers']))
+    ncore = os.cpu_count() or 1
+    N = ncol // binning
+    
+    def chunk_bytes(rows):
+        rows_bin = int(np.ceil(rows / float(binning)))
+        # with binning the projections are binned at read time (float32)
+        raw = nproj * rows * ncol * itemsize if binning == 1 else nproj * rows_bin * N * 4
+        prep = 2 * nproj * rows_bin * N * 4
+        phase = 0
+        if variableDict['phase']:
+            # float32 padded frame, half complex64 spectrum and inverse FFT result per core
+            phase = ncore * phase_pad_size(rows_bin, variableDict) * phase_pad_size(N, variableDict) * (4 + 4 + 8)
+        if variableDict['algorithm'] in UNPADDED:
+            # filtered copy and slices on the N x N grid
+            pad = nproj * rows_bin * N * 4
+            rec = rows_bin * N ** 2 * 4
+        else:
+            pad = nproj * rows_bin * (3 * N // 2) * 4
+            rec = rows_bin * (3 * N // 2) ** 2 * 4
+        worker = raw + prep + phase + pad + rec + images * rows_bin * N * N * 4
+        # the writer queue holds up to DEPTH more reconstructed chunks
+        inflight = (pipeline_lib.DEPTH + 1) * raw + (2 * pipeline_lib.DEPTH + 1) * rec + nworkers * worker
+        # averaged flat and dark shared by all chunks
+        return inflight + 2 * nrows * ncol * 4
+
+    rows = pipeline_lib.largest_chunk(nrows, chunk_bytes, variableDict['mem_budget'], step=binning)
+    log_lib.info("  *** memory budget %.1f GB: %d sinograms per chunk (%.1f GB)" % (variableDict['mem_budget'] / 2.0**30, rows, chunk_bytes(rows) / 2.0**30))
+
+    return rows
+
+
+def full_rec_name(variableDict):
+    """
+    Base name of the tiff slices of a full reconstruction, its hdf5 file is the folder name + .h5.
+    """
+
+    if os.path.dirname(variableDict['fname']) != '':
+        return variableDict['rec_dir'] + os.sep + os.path.splitext(os.path.basename(variableDict['fname']))[0]+ '_full_rec/' + 'recon'
+    return '.' + os.sep + os.path.splitext(os.path.basename(variableDict['fname']))[0]+ '_full_rec/' + 'recon'
+
+
+def rec_full(variableDict):
+    
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+
+    if variableDict['mem_budget'] is None:
+        nSino_per_chunk = 32  # always power of 2           # number of sinogram chunks to reconstruct
+                                                            # only one chunk at the time is reconstructed
+                                                            # allowing for limited RAM machines to complete a full reconstruction
+                                                            #
+                                                            # set this number based on how much memory your computer has
+                                                            # if it cannot complete a full size reconstruction lower it
+                                                            # or set --mem-budget
+    else:
+        nSino_per_chunk = sino_per_chunk(variableDict, data_shape)
+
+    chunks = int(np.ceil(data_shape[1]/nSino_per_chunk))    
+
+    # Select sinogram range to reconstruct.
+    sino_start = 0
+    sino_end = data_shape[1]
+    
+    log_lib.info("Reconstructing [%d] slices from slice [%d] to [%d] in [%d] chunks of [%d] slices each" % ((sino_end - sino_start), sino_start, sino_end, chunks, nSino_per_chunk))            
+
+    fname = full_rec_name(variableDict)
+
+    # flat and dark are read once, the chunks only read projections
+    flat, dark, theta = read_flat_dark(variableDict)
+
+    sinos = []
+    for iChunk in range(0,chunks):
+        sino_chunk_start = sino_start + nSino_per_chunk*iChunk
+        sino_chunk_end = min(sino_start + nSino_per_chunk*(iChunk+1), sino_end)
+        sinos.append((sino_chunk_start, sino_chunk_end))
+
+    def read(sino):
+        log_lib.info('  *** read [%i, %i]' % sino)
+        return read_projection(variableDict, sino)
+
+    # zinger counts of each projection over the whole volume, saved with the reconstructions
+    zingers = prep_lib.ZingerCounts() if variableDict['zinger'] else None
+
+    def process(sino, proj, zingers=None):
+        log_lib.info('  *** reconstruct [%i, %i]' % sino)
+        return reconstruct(variableDict, sino, proj, flat, dark, theta, binned=variableDict['binning'] > 0, zingers=zingers)
+
+    # integer output: a first pass reconstructs a few slices spread over the volume to set
+    # the range, each chunk is then converted by the writer
+    quantize = None
+    attrs = variableDict
+    if variableDict['dtype'] != 'float32':
+        quantize = writer_lib.Quantizer(variableDict['dtype'])
+        step = int(np.power(2, int(variableDict['binning'])))
+        # phase retrieval filters across the rows: reconstruct bands of rows as chunks and
+        # sample their central rows only, as far from the band edges as in the real chunks
+        band = min(max(32, 4 * step), data_shape[1] // step * step) if variableDict['phase'] else step
+        starts = (min(max(0, int(r * data_shape[1]) - band // 2), data_shape[1] - band) // step * step for r in np.linspace(0.1, 0.9, 8))
+        bands = sorted(set((start, start + band) for start in starts))
+        log_lib.info("  *** %s range from %d bands of %d slices" % (variableDict['dtype'], len(bands), band))
+
+        def sample(sino, rec):
+            edge = len(rec) // 4
+            quantize.add(rec[edge:len(rec) - edge])
+
+        pipeline_lib.run(bands, read, process, sample, nworkers=variableDict['nworkers'])
+        vmin, vmax = quantize.fit()
+        log_lib.info("  *** %s range: [%g, %g]" % (variableDict['dtype'], vmin, vmax))
+        attrs = dict(variableDict, dtype_min=vmin, dtype_max=vmax)
+
+    # the chunks are written by a background thread while the next ones are reconstructed
+    if variableDict['output'] == 'hdf5':
+        nslices = int(np.ceil(data_shape[1] / np.power(2, float(variableDict['binning']))))
+        writer = writer_lib.Hdf5Writer(os.path.dirname(fname) + '.h5', nslices, compression=variableDict['compression'], levels=variableDict['levels'], attrs=attrs, quantize=quantize)
+    else:
+        writer = writer_lib.TiffWriter(fname, quantize=quantize)
+    log_lib.info("  *** reconstructions: %s" % writer.fname)
+
+    def write(sino, rec):
+        strt = int(sino[0] / np.power(2, float(variableDict['binning'])))
+        writer.write(strt, rec)
+        log_lib.info('  *** queued for writing [%i, %i]' % sino)
+
+    # read chunk N+1, reconstruct chunk N and write chunk N-1 at the same time
+    try:
+        pipeline_lib.run(sinos, read, lambda sino, proj: process(sino, proj, zingers), write, nworkers=variableDict['nworkers'])
+        save_zinger_counts(writer, zingers)
+    finally:
+        writer.close()
+
+    rec_log_msg = "\n" + "recon --axis " + str(variableDict['rot_center']) + " --type full " + variableDict['fname']
+    if (variableDict['binning'] > 0):
+        rec_log_msg = rec_log_msg + " --bin " + str(variableDict['binning'])
+
+    # log_lib.info('  *** command to repeat the reconstruction: %s' % rec_log_msg)
+
+    p = pathlib.Path(fname)
+    lfname = variableDict['logs_home'] + p.parts[-3] + '.log'
+    log_lib.info('  *** command added to %s ' % lfname)
+    with open(lfname, "a") as myfile:
+        myfile.write(rec_log_msg)
+    
+
+def rec_frames(variableDict, sino, data, theta, rot_center, length, ranges, mask_ratio=None):
+    """
+    Reconstruct the time frames of preprocessed sinograms, filtered or padded once for all
+    the frames. Yields (frame, rec) before the ring removal and the circular mask of the
+    methods that are not DIRECT.
+    """
+
+    algorithm = variableDict['algorithm']
+    overlap = variableDict['frame_overlap']
+    if algorithm == 'fbp':
+        for frame, rec in dyn_lib.recon(data, theta, rot_center, length, overlap, variableDict['filter'], mask_ratio):
+            yield frame, rec
+    elif algorithm == 'gridrec':
+        data = gridrec_filter(variableDict, data)
+        for frame, (start, end) in enumerate(ranges):
+            yield frame, rec_gridrec(variableDict, data[start:end], theta[start:end], rot_center, filtered=True)
+    elif algorithm in iter_lib.METHODS:
+        # fbp warm starts share the filtered projections and backprojections of dyn_lib
+        fbp = dyn_lib.recon(data, theta, rot_center, length, overlap, variableDict['filter'], mask_ratio) if variableDict['warm_start'] == 'fbp' else None
+        init = None
+        for frame, (start, end) in enumerate(ranges):
+            if fbp is not None:
+                init = next(fbp)[1]
+            rec = rec_iterative(variableDict, sino, data[start:end], theta[start:end], rot_center, mask_ratio, init)
+            if variableDict['warm_start'] == 'previous':
+                # the next frame starts from this one
+                init = rec
+            yield frame, rec
+    else:
+        N = data.shape[2]
+        data = pad_sinogram(data)
+        for frame, (start, end) in enumerate(ranges):
+            yield frame, _recon(variableDict, data[start:end], theta[start:end], rot_center + N//4)[:,N//4:5*N//4,N//4:5*N//4]
+
+
+def rec_dynamic(variableDict):
+    """
+    Reconstruct the time frames of frame_length projections, overlapping by frame_overlap, of a continuous rotation scan.
+
+    Each chunk is read and preprocessed once for all its frames (rec_frames), which are written as they are reconstructed.
+    """
+
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+    flat, dark, theta = read_flat_dark(variableDict)
+    length = variableDict['frame_length'] or dyn_lib.frame_length(theta)
+    ranges = dyn_lib.frames(len(theta), length, variableDict['frame_overlap'])
+    # fbp frames, and the fbp warm starts of sirt/cgls, are sums of dyn_lib block images
+    blocks = variableDict['algorithm'] == 'fbp' or (variableDict['algorithm'] in iter_lib.METHODS and variableDict['warm_start'] == 'fbp')
+
+    if variableDict['mem_budget'] is None:
+        nSino_per_chunk = 32
+    else:
+        images = dyn_lib.images(length, variableDict['frame_overlap']) if blocks else 0
+        nSino_per_chunk = sino_per_chunk(variableDict, data_shape, images)
+    sinos = [(start, min(start + nSino_per_chunk, data_shape[1])) for start in range(0, data_shape[1], nSino_per_chunk)]
+
+    log_lib.info("Reconstructing [%d] frames of [%d] projections overlapping by [%d] in [%d] chunks of [%d] slices each" % (len(ranges), length, variableDict['frame_overlap'], len(sinos), nSino_per_chunk))
+    if variableDict['dtype'] != 'float32':
+        log_lib.warning("  *** dynamic reconstructions are written as float32")
+
+    fname = os.path.join(variableDict['rec_dir'], os.path.splitext(os.path.basename(variableDict['fname']))[0] + '_dyn_rec')
+    if variableDict['output'] == 'hdf5':
+        nslices = int(np.ceil(data_shape[1] / np.power(2, float(variableDict['binning']))))
+        attrs = dict(variableDict, frame_length=length)
+        writer = writer_lib.FrameHdf5Writer(fname + '.h5', len(ranges), nslices, compression=variableDict['compression'], attrs=attrs)
+    else:
+        writer = writer_lib.FrameTiffWriter(fname)
+    log_lib.info("  *** reconstructions: %s" % writer.fname)
+
+    binned = variableDict['binning'] > 0
+    mask_ratio = 0.95 if variableDict['circ_mask'] else None
+
+    def read(sino):
+        log_lib.info('  *** read [%i, %i]' % sino)
+        return read_projection(variableDict, sino)
+
+    zingers = prep_lib.ZingerCounts() if variableDict['zinger'] else None
+
+    def process(sino, proj):
+        log_lib.info('  *** reconstruct [%i, %i]' % sino)
+        data, theta_chunk = prepare(variableDict, sino, proj, flat, dark, theta, binned, zingers)
+        data, rot_center = rec_geometry(variableDict, sino, data, binned)
+        strt = int(sino[0] / np.power(2, float(variableDict['binning'])))
+        with log_lib.timed('reconstruction (%s, %d frames)' % (variableDict['algorithm'], len(ranges))):
+            for frame, rec in rec_frames(variableDict, sino, data, theta_chunk, rot_center, length, ranges, mask_ratio):
+                if 'ring' in variableDict['stripe_methods']:
+                    rec = stripe_lib.remove_ring(rec, rwidth=variableDict['ring_width'])
+                if variableDict['circ_mask'] and variableDict['algorithm'] not in DIRECT:
+                    rec = tomopy.circ_mask(rec, axis=0, ratio=0.95)
+                writer.write((frame, strt), rec)
+
+    try:
+        pipeline_lib.run(sinos, read, process, lambda sino, rec: log_lib.info('  *** queued for writing [%i, %i]' % sino), nworkers=variableDict['nworkers'])
+        save_zinger_counts(writer, zingers)
+    finally:
+        writer.close()
+
+
+def phase_alpha_test_old(variableDict):
+    
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+    ssino = int(data_shape[1] * variableDict['nsino'])
+
+    # Select sinogram range to reconstruct       
+    sino_start = ssino - 32
+    sino_end = ssino + 32
+    chunks = 1          # number of sinogram chunks to reconstruct
+                        # only one chunk at the time is reconstructed
+                        # allowing for limited RAM machines to complete a full reconstruction
+
+    nSino_per_chunk = (sino_end - sino_start)/chunks
+    log_lib.info("Reconstructing [%d] slices from slice [%d] to [%d] in [%d] chunks of [%d] slices each" % ((sino_end - sino_start), sino_start, sino_end, chunks, nSino_per_chunk))            
+
+    strt = 0
+    for iChunk in range(0,chunks):
+        log_lib.info('chunk # %i' % (iChunk+1))
+        sino_chunk_start = int(sino_start + nSino_per_chunk*iChunk)
+        sino_chunk_end = int(sino_start + nSino_per_chunk*(iChunk+1))
+        log_lib.info('  *** [%i, %i]' % (sino_chunk_start, sino_chunk_end))
+                
+        if sino_chunk_end > sino_end: 
+            break
+
+        sino = (int(sino_chunk_start), int(sino_chunk_end))
+        # Reconstruct.
+        alphaa = [1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1]
+        for k in range(len(alphaa)):
+            variableDict['alpha'] = alphaa[k]
+            log_lib.info('  *** alpha [%f]' % (variableDict['alpha']))
+            rec = reconstruct(variableDict, sino)
+                
+            if os.path.dirname(variableDict['fname']) != '':
+                fname = variableDict['rec_dir'] + os.sep + os.path.splitext(os.path.basename(variableDict['fname']))[0]+ '_subset_rec/' + 'recon_' + str(alphaa[k])
+            else:
+                fname = '.' + os.sep + os.path.splitext(os.path.basename(variableDict['fname']))[0]+ '_subset_rec/' + 'recon_' + str(alphaa[k])
+
+            log_lib.info("  *** reconstructions: %s" % fname)
+            dxchange.write_tiff_stack(rec, fname=fname, start=strt)
+        strt += sino[1] - sino[0]
+
+    rec_log_msg = "\n" + "python rec.py --axis " + str(variableDict['rot_center']) + " --type subset " + variableDict['fname']
+    # log_lib.info('  *** command to repeat the reconstruction: %s' % rec_log_msg)
+
+    p = pathlib.Path(fname)
+    lfname = variableDict['logs_home'] + p.parts[-3] + '.log'
+    log_lib.info('  *** command added to %s ' % lfname)
+    with open(lfname, "a") as myfile:
+        myfile.write(rec_log_msg)
+
+
+def try_phase(variableDict):
+    """
+    Reconstruct the slice at nsino for a range of phase retrieval alphas (and distances).
+
+    The projections are read and preprocessed once and phase_lib.sweep filters the FFT of
+    each projection for every (distance, alpha) pair. The slices are reconstructed together
+    and written as a single stack try_phase/<data set>.h5 with the alpha and distance of
+    each slice as attributes. With --bin the projections are binned at read time as in
+    rec_full, so that the phase is retrieved at the same pixel size.
+    """
+
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+    ssino = int(data_shape[1] * variableDict['nsino'])
+    f = int(np.power(2, variableDict['binning']))
+
+    # phase retrieval mixes neighbouring rows: preprocess a band of 32 (binned) rows around the slice
+    sino = (max(0, ssino // f - 16) * f, min(data_shape[1], (ssino // f + 16) * f))
+    row = ssino // f - sino[0] // f
+    proj = read_projection(variableDict, sino)
+    flat, dark, theta = read_flat_dark(variableDict)
+    data, theta, pixel_size = preprocess(variableDict, sino, proj, flat, dark, theta, binned=variableDict['binning'] > 0)
+    del proj
+
+    alphas = variableDict['phase_alphas'] or [1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1]
+    distances = variableDict['phase_distances'] or [variableDict['sample_detector_distance']]
+    params = [(dist, alpha) for dist in distances for alpha in alphas]
+    log_lib.info("  *** phase retrieval of slice %d with %d alphas and %d distances" % (ssino, len(alphas), len(distances)))
+
+    sinos = phase_lib.sweep(data, [row], pixel_size*1e-4, variableDict['monochromator_energy'], [(dist/10.0, alpha) for dist, alpha in params])
+    del data
+
+    # one slice per (distance, alpha): a single reconstruction of len(params) sinograms
+    data = np.ascontiguousarray(sinos[:, :, 0, :].swapaxes(0, 1))
+    data = minus_log(dict(variableDict, phase=True), data)
+    slc = (sino[0] + row * f, sino[0] + (row + 1) * f)
+    rot_center = row_centers(variableDict, slc, 1)[0]
+    rec = rec_sinogram(dict(variableDict, rot_center=rot_center, rot_center_slope=0), slc, data, theta, binned=True)
+
+    if os.path.dirname(variableDict['fname']) != '':
+        fname = variableDict['rec_dir'] + os.sep + 'try_phase/' + path_base_name(variableDict['fname']) + '.h5'
+    else:
+        fname = '.' + os.sep + 'try_phase/' + path_base_name(variableDict['fname']) + '.h5'
+    attrs = dict(variableDict, alpha=[alpha for dist, alpha in params], sample_detector_distance=[dist for dist, alpha in params])
+    with writer_lib.Hdf5Writer(fname, len(params), attrs=attrs) as writer:
+        writer.write(0, rec)
+    for k, (dist, alpha) in enumerate(params):
+        log_lib.info("  *** slice %d: alpha %g, sdd %g mm" % (k, alpha, dist))
+    log_lib.info("  *** reconstructions: %s" % fname)
+
+
+def rec_preview(variableDict):
+    """
+    Quick look of a data set in a few seconds.
+
+    Every preview_step-th projection is read and binned (at least by 4) at read time, the
+    whole binned volume is reconstructed and the slice at nsino and the two central vertical
+    slices are written side by side as a single png or tiff image in rec_dir/preview/.
+    """
+
+    t0 = datetime.now()
+    proj_step = max(1, int(variableDict['preview_step']))
+    params = dict(variableDict, binning=max(int(variableDict['binning']), 2), reverse=False, missing=False)
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+    sino = (0, data_shape[1])
+
+    proj = read_projection(params, sino, proj_step=proj_step)
+    flat, dark, theta = read_flat_dark(params)
+    if variableDict['reverse']:
+        theta = np.linspace(np.pi, theta[1] - theta[0], len(theta))
+    theta = theta[::proj_step]
+    log_lib.info("  *** preview: %d projections binned by %d" % (len(theta), 2**params['binning']))
+
+    rec = reconstruct(params, sino, proj, flat, dark, theta, binned=True)
+    del proj
+
+    # axial slice at nsino, then the two vertical slices through the middle
+    nslices, N = rec.shape[0], rec.shape[2]
+    mosaic = np.zeros((max(N, nslices), 3 * N), dtype=np.float32)
+    mosaic[:N, :N] = rec[min(int(nslices * variableDict['nsino']), nslices - 1)]
+    mosaic[:nslices, N:2*N] = rec[:, N//2, :]
+    mosaic[:nslices, 2*N:] = rec[:, :, N//2]
+
+    if os.path.dirname(variableDict['fname']) != '':
+        fname = variableDict['rec_dir'] + os.sep + 'preview/' + os.path.splitext(os.path.basename(variableDict['fname']))[0]
+    else:
+        fname = './preview/' + os.path.splitext(os.path.basename(variableDict['fname']))[0]
+    if variableDict['preview_format'] == 'tiff':
+        fname = fname + '.tiff'
+        dxchange.write_tiff(mosaic, fname=fname, overwrite=True)
+    else:
+        fname = fname + '.png'
+        if not os.path.exists(os.path.dirname(fname)):
+            os.makedirs(os.path.dirname(fname))
+        # gray levels over the range of the reconstructed (not masked) pixels
+        values = mosaic[mosaic != 0]
+        vmin, vmax = np.percentile(values, (0.5, 99.5)) if values.size else (0, 1)
+        pl.imsave(fname, mosaic, cmap='gray', vmin=vmin, vmax=vmax)
+
+    log_lib.info("  *** preview: %s (%.1f s)" % (fname, (datetime.now() - t0).total_seconds()))
+
+
+def rec_slice(variableDict):
+    
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+    ssino = int(data_shape[1] * variableDict['nsino'])
+
+    # Select sinogram range to reconstruct       
+    start = ssino
+    end = start + 1
+    sino = (start, end)
+
+    rec = reconstruct(variableDict, sino)
+    if os.path.dirname(variableDict['fname']) != '':
+        fname = variableDict['rec_dir'] + os.sep + 'slice_rec/' + 'recon_' + os.path.splitext(os.path.basename(variableDict['fname']))[0]
+    else:
+        fname = './slice_rec/' + 'recon_' + os.path.splitext(os.path.basename(variableDict['fname']))[0]
+    dxchange.write_tiff_stack(rec, fname=fname)
+    log_lib.info("  *** rec: %s" % fname)
+    log_lib.info("  *** slice: %d" % start)
+    
+
+def read_sinogram(variableDict, sino):
+    """
+    Read, downsample and preprocess (normalize, remove stripes, -log) a sinogram range.
+
+    Returns
+    -------
+    data : ndarray
+        Preprocessed sinograms.
+    theta : ndarray
+        Projection angles in radians.
+    """
+
+    # Read APS 32-BM raw data.
+    proj, flat, dark, theta = read_raw(variableDict, sino)
+
+    # bin the columns before the preprocessing
+    if variableDict['binning'] > 0:
+        proj, flat, dark = (prep_lib.bin_frames(frames, variableDict['binning'], rows=False) for frames in (proj, flat, dark))
+
+    if variableDict['reverse']:
+        step_size = (theta[1] - theta[0]) 
+        theta_size = dxreader.read_dx_dims(variableDict['fname'], 'data')[0]
+        theta = np.linspace(np.pi , (0+step_size), theta_size)    # zinger_removal
+        log_lib.warning("  *** overwrite theta")
+
+    if variableDict['missing']:
+        miss_angles = [variableDict['start'], variableDict['end']]
+        
+        # Manage the missing angles:
+        proj = np.concatenate((proj[0:miss_angles[0],:,:], proj[miss_angles[1]+1:-1,:,:]), axis=0)
+        theta = np.concatenate((theta[0:miss_angles[0]], theta[miss_angles[1]+1:-1]))
+
+    # Flat-field correction of raw data.
+    data = prep_lib.normalize(proj, flat, dark, cutoff=1.4)
+
+    # remove stripes
+    data = stripe_lib.remove_stripe_fw(data,level=7,wname='sym16',sigma=1,pad=True)
+
+    log_lib.info("  *** raw data: %s" % variableDict['fname'])
+
+    data = prep_lib.minus_log(data)
+
+    return data, theta
+
+
+def try_center(variableDict):
+    
+    data_shape = get_dx_dims(variableDict['fname'], 'data')
+    log_lib.info(data_shape)
+    ssino = int(data_shape[1] * variableDict['nsino'])
+
+    # downsample
+    variableDict['rot_center'] = variableDict['rot_center']/np.power(2, float(variableDict['binning']))
+    variableDict['center_search_width'] = variableDict['center_search_width']/np.power(2, float(variableDict['binning']))
+
+    center_range = (variableDict['rot_center']-variableDict['center_search_width'], variableDict['rot_center']+variableDict['center_search_width'], 0.5)
+    log_lib.info('  *** reconstruct slice %d with rotation axis ranging from %.2f to %.2f in %.2f pixel steps' % (ssino, center_range[0], center_range[1], center_range[2]))
+
+    # Select sinogram range to reconstruct
+    start = ssino
+    end = start + 1
+    sino = (start, end)
+
+    data, theta = read_sinogram(variableDict, sino)
+    log_lib.info("  *** center: %f" % variableDict['rot_center'])
+
+    # Reconstruct the same slice with a range of centers. 
+    rec = center_lib.sweep(data, theta, np.arange(*center_range), algorithm=variableDict['algorithm'], filter_name=variableDict['filter'])
+
+    index = 0
+    # Save images to a temporary folder.
+    fname = variableDict['rec_dir'] + os.sep + 'try_center/' + path_base_name(variableDict['fname']) + os.sep + 'recon_' ##+ os.path.splitext(os.path.basename(variableDict['fname']))[0]    
+    for axis in np.arange(*center_range):
+        rfname = fname + str('{0:.2f}'.format(axis*np.power(2, float(variableDict['binning']))) + '.tiff')
+        dxchange.write_tiff(rec[index], fname=rfname, overwrite=True)
+        index = index + 1
+
+    log_lib.info("  *** reconstructions: %s" % fname)
+
+    if variableDict['plot']:
+        slider(rec, np.arange(*center_range))
+     
+
+def auto_center(variableDict):
+    """
+    Coarse to fine rotation axis search scored by variableDict['center_metric'].
+
+    Returns
+    -------
+    rot_center : float
+        Rotation axis location (pixel).
+    curves : dict
+        Centers and scores of the coarse and fine searches.
+    """
+
+    log_lib.info("  *** calculating automatic center (%s)" % variableDict['center_metric'])
+    data_size = get_dx_dims(variableDict['fname'], 'data')
+    ssino = int(data_size[1] * variableDict['nsino'])
+
+    # Select sinogram range to reconstruct
+    start = ssino
+    end = start + 1
+    sino = (start, end)
+
+    # the search bins the sinogram itself
+    data, theta = read_sinogram(dict(variableDict, binning=0), sino)
+
+    rot_center, curves = center_lib.auto_center(data, theta, metric=variableDict['center_metric'], algorithm='gridrec', filter_name=variableDict['filter'])
+    log_lib.info("  *** automatic center: %f" % rot_center)
+    return rot_center, curves
+
+
+def find_rotation_axis_tilt(variableDict):
+    """
+    Find the rotation axis on variableDict['tilt'] sinograms spread over the detector height
+    and fit a linear center(row).
+
+    Returns
+    -------
+    rot_center : float
+        Fitted center at row nsino (pixel).
+    slope : float
+        Change of the center per detector row.
+    rows, centers : list
+        Sinograms used and their centers.
+    """
+
+    nrows = get_dx_dims(variableDict['fname'], 'data')[1]
+    nsinos = np.linspace(0.1, 0.9, int(variableDict['tilt']))
+    rows = [int(nrows * nsino) for nsino in nsinos]
+    log_lib.info("  *** calculating the rotation axis on rows %s" % rows)
+
+    centers = pipeline_lib.thread_map(lambda nsino: find_rotation_axis(dict(variableDict, nsino=nsino, tilt=0)), [(nsino,) for nsino in nsinos], len(rows))
+
+    intercept, slope = center_lib.fit_tilt(rows, centers)
+    rot_center = intercept + slope * int(nrows * variableDict['nsino'])
+    log_lib.info("  *** tilted rotation axis: %f at row %d, %f pixel per row" % (rot_center, int(nrows * variableDict['nsino']), slope))
+
+    return rot_center, slope, rows, [float(center) for center in centers]
+
+
+def find_rotation_axis(variableDict):
+    
+    if variableDict['center_metric'] is not None:
+        return auto_center(variableDict)[0]
+
+    log_lib.info("  *** calculating automatic center")
+    data_size = get_dx_dims(variableDict['fname'], 'data')
+    ssino = int(data_size[1] * variableDict['nsino'])
+
+    # Select sinogram range to reconstruct
+    start = ssino
+    end = start + 1
+    sino = (start, end)
+
+    # Read APS 32-BM raw data
+    proj, flat, dark, theta = read_raw(variableDict, sino)
+        
+    # Flat-field correction of raw data
+    data = prep_lib.normalize(proj, flat, dark, cutoff=1.4)
+
+    # remove stripes
+    data = stripe_lib.remove_stripe_fw(data,level=5,wname='sym16',sigma=1,pad=True)
+
+    # find rotation center
+    rot_center = tomopy.find_center_vo(data)   
+    log_lib.info("  *** automatic center: %f" % rot_center)
+    return rot_center
+
+
+class ReconPipeline(object):
+    """
+    Reconstruction of a data set, or of a folder of data sets, with one set of parameters.
+
+    Parameters
+    ----------
+    params : dict
+        variableDict entries overriding the defaults, e.g. a per-user preset.
+    """
+
+    def __init__(self, **params):
+        self.variableDict = dict(variableDict)
+        self.variableDict.update(params)
+        # last data set reconstructed, the warm start of the next one
+        self.previous_fname = None
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Build the pipeline from the argparse namespace of rec_config sections, see rec_config.parse_args for presets.
+        """
+        return cls(**dict((key, value) for key, value in vars(args).items() if key != 'config'))
+
+    @classmethod
+    def from_config(cls, config_name=rec_config.NAME, sections=rec_config.RECON_PARAMS, **preset):
+        """
+        Build the pipeline from the sections of a recon.conf file.
+        """
+        parser = argparse.ArgumentParser()
+        rec_config.Params(sections).add_arguments(parser)
+        return cls.from_args(rec_config.parse_args(parser, config_name=config_name, preset=preset))
+
+    def reconstruct(self, fname, rot_center=None, rot_center_slope=None):
+        """
+        Run the selected reconstruction type on a single file.
+        """
+        params = dict(self.variableDict)
+        params['fname'] = fname
+        params['previous_fname'] = self.previous_fname
+        if rot_center is not None:
+            params['rot_center'] = rot_center
+        if rot_center_slope is not None:
+            params['rot_center_slope'] = rot_center_slope
+
+        # Set default rotation axis location
+        if params['rot_center'] == 0:
+            if params['auto'] and params['tilt'] > 1:
+                params['rot_center'], params['rot_center_slope'] = find_rotation_axis_tilt(params)[:2]
+            elif params['auto']:
+                params['rot_center'] = find_rotation_axis(params)
+            else:
+                data_shape = get_dx_dims(params['fname'], 'data')
+                params['rot_center'] = data_shape[2]/2
+
+        if params['rec_type'] == "try":
+            try_center(params)
+        elif params['rec_type'] == "full":
+            rec_full(params)
+            self.previous_fname = fname
+        elif params['rec_type'] == "preview":
+            rec_preview(params)
+        elif params['rec_type'] == "dynamic":
+            rec_dynamic(params)
+        elif params['rec_type'] == "phase":
+            params['phase'] = True
+            try_phase(params)
+        else:
+            rec_slice(params)
+
+    def run(self, fname):
+        """
+        Reconstruct a single file, or all files of a folder listed in its rotation_axis.json.
+        """
+        if os.path.isfile(fname):
+            log_lib.info("Reconstructing a single file")
+            self.reconstruct(fname)
+
+        elif os.path.isdir(fname):
+            log_lib.info("Reconstructing a folder containing multiple files")
+            # Add a trailing slash if missing
+            top = os.path.join(fname, '')
+
+            # Load the the rotation axis positions.
+            jfname = top + "rotation_axis.json"
+
+            dictionary = read_rot_centers(jfname)
+            # tilted axis slopes fitted by find_center --tilt
+            info = center_lib.CenterCache(top, []).info
+
+            for key in dictionary:
+                dict2 = dictionary[key]
+                for h5fname in dict2:
+                    log_lib.info("Reconstructing %s" % (top + h5fname))
+                    self.reconstruct(top + h5fname, rot_center=dict2[h5fname], rot_center_slope=info.get(h5fname, {}).get('slope'))
+        else:
+            log_lib.info("Directory or File Name does not exist: %s" % fname)
+
+
+def main(arg, **preset):
+    """
+    recon command line: reconstruct the file or folder given on the command line.
+
+    Parameters
+    ----------
+    arg : list
+        Command line arguments.
+    preset : dict
+        variableDict entries used as defaults, e.g. by a per-user rec.py.
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("fname", help="Directory containing multiple datasets or file name of a single dataset: /data/ or /data/sample.h5")
+    rec_config.Params(rec_config.RECON_PARAMS).add_arguments(parser)
+
+    args = rec_config.parse_args(parser, arg, rec_config.get_config_name(), preset)
+
+    # create logger
+    home = str(pathlib.Path.home())
+    logs_home = home + '/logs/'
+
+    # make sure logs directory exists
+    if not os.path.exists(logs_home):
+        os.makedirs(logs_home)
+
+    lfname = logs_home + 'rec_' + datetime.strftime(datetime.now(), "%Y-%m-%d_%H:%M:%S") + '.log'
+    log_lib.setup_logger(lfname)
+
+    pipeline = ReconPipeline.from_args(args)
+    pipeline.variableDict['rec_dir'] = os.path.dirname(args.fname) + '_rec'
+    pipeline.variableDict['logs_home'] = logs_home
+    pipeline.run(args.fname)
@@ -0,0 +1,116 @@
+"""
+SIRT-FBP filters (sirtfilter package) cached on disk and in memory.
+"""
+
+import os
+import hashlib
+import pathlib
+import tempfile
+import threading
+import collections
+
+import numpy as np
+
+try:
+    import sirtfilter
+except ImportError:
+    sirtfilter = None
+
+import log_lib
+
+
+CACHE_DIR = os.path.join(str(pathlib.Path.home()), '.cache', 'recon', 'sirtfbp')
+
+
+def filter_key(ncol, theta, num_iter):
+    """
+    Cache key of a filter: detector width, number of iterations and a hash of the angles.
+    """
+
+    theta_hash = hashlib.sha1(np.ascontiguousarray(theta, dtype=np.float64).tobytes()).hexdigest()[:16]
+    return 'sirtfbp_%d_%d_%s' % (ncol, num_iter, theta_hash)
+
+
+class FilterCache(object):
+    """
+    SIRT-FBP filters in tomopy custom2d format, cached in a directory and in memory.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the .npy filter files.
+    max_files : int
+        Number of filter files kept in cache_dir.
+    max_memory : int
+        Number of filters kept in memory.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_files=64, max_memory=4):
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self.max_memory = max_memory
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _compute(self, ncol, theta, num_iter):
+        if sirtfilter is None:
+            raise ImportError("the sirtfbp algorithm needs the sirtfilter package: conda install -c http://dmpelt.gitlab.io/sirtfilter/ sirtfilter")
+        log_lib.info("  *** computing the sirt-fbp filter: %d columns, %d angles, %d iterations" % (ncol, len(theta), num_iter))
+        # an empty filter_dir: never pick up a .mat file of another geometry
+        with tempfile.TemporaryDirectory() as filter_dir:
+            sirtfbp_filter = sirtfilter.getfilter(ncol, theta, num_iter, filter_dir=filter_dir + os.sep)
+        return np.asarray(sirtfilter.convert_to_tomopy_filter(sirtfbp_filter, ncol), dtype=np.float32)
+
+    def _evict(self):
+        files = sorted(pathlib.Path(self.cache_dir).glob('sirtfbp_*.npy'), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def get(self, ncol, theta, num_iter):
+        """
+        Filter of a geometry, from memory, from the cache directory or computed and saved there.
+        """
+
+        key = filter_key(ncol, theta, num_iter)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            fname = os.path.join(self.cache_dir, key + '.npy')
+            try:
+                tomopy_filter = np.load(fname)
+                # mtime marks the last use for the eviction
+                os.utime(fname)
+            except (IOError, OSError, ValueError):
+                tomopy_filter = self._compute(ncol, theta, num_iter)
+                try:
+                    if not os.path.exists(self.cache_dir):
+                        os.makedirs(self.cache_dir)
+                    # other processes only ever see complete files
+                    tmp = os.path.join(self.cache_dir, '.tmp_%s.%d.npy' % (key, os.getpid()))
+                    np.save(tmp, tomopy_filter)
+                    os.replace(tmp, fname)
+                    self._evict()
+                except (IOError, OSError) as error:
+                    log_lib.warning("  *** sirt-fbp filter not saved in %s: %s" % (self.cache_dir, error))
+
+            self._memory[key] = tomopy_filter
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+
+        return tomopy_filter
+
+
+_cache = FilterCache()
+
+
+def get_filter(ncol, theta, num_iter):
+    """
+    SIRT-FBP filter of a geometry in tomopy custom2d format, from the shared cache.
+    """
+
+    return _cache.get(ncol, theta, num_iter)
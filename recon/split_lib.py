@@ -0,0 +1,81 @@
+"""
+Time frames of a continuous rotation scan as HDF5 files mapped onto the original file.
+"""
+
+import os
+
+import h5py
+import numpy as np
+
+import dyn_lib
+import log_lib
+
+
+def frame_name(fname, frame, out_dir=None):
+    """
+    File name of a time frame of fname: sample_0153.h5 -> sample_0153_000.h5, in out_dir or next to fname.
+    """
+
+    base = os.path.splitext(os.path.basename(fname))[0]
+    return os.path.join(out_dir or os.path.dirname(fname), '%s_%03d.h5' % (base, frame))
+
+
+def split(fname, length, overlap=0, flat_file=None, dark_file=None, out_dir=None):
+    """
+    Create the time frame files of a scan.
+
+    Parameters
+    ----------
+    fname : str
+        Scan file with /exchange/data (and /exchange/theta).
+    length, overlap : int
+        Number of projections of a frame and of projections shared by consecutive frames,
+        see dyn_lib.frames(). length 0 for the projections of 180 degrees.
+    flat_file, dark_file : str
+        Files holding /exchange/data_white and /exchange/data_dark, None for fname.
+    out_dir : str
+        Folder of the frame files, None for the folder of fname.
+
+    Returns
+    -------
+    list
+        Frame file names.
+    """
+
+    out_dir = out_dir or os.path.dirname(os.path.abspath(fname))
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    with h5py.File(fname, 'r') as h5:
+        data = h5['exchange/data']
+        shape, dtype = data.shape, data.dtype
+        theta = h5['exchange/theta'][:] if 'exchange/theta' in h5 else None
+
+    if length == 0:
+        if theta is None:
+            raise ValueError("%s has no /exchange/theta, set the frame length" % fname)
+        length = dyn_lib.frame_length(theta * np.pi / 180)
+    ranges = dyn_lib.frames(shape[0], length, overlap)
+
+    def source(name):
+        return os.path.relpath(os.path.abspath(name), out_dir)
+
+    names = []
+    for frame, (start, end) in enumerate(ranges):
+        layout = h5py.VirtualLayout(shape=(end - start,) + shape[1:], dtype=dtype)
+        layout[:] = h5py.VirtualSource(source(fname), 'exchange/data', shape=shape)[start:end]
+
+        name = frame_name(fname, frame, out_dir)
+        with h5py.File(name, 'w') as h5:
+            h5.create_virtual_dataset('exchange/data', layout)
+            h5['exchange/data_white'] = h5py.ExternalLink(source(flat_file or fname), 'exchange/data_white')
+            h5['exchange/data_dark'] = h5py.ExternalLink(source(dark_file or fname), 'exchange/data_dark')
+            if theta is not None:
+                h5['exchange/theta'] = theta[start:end]
+            h5.attrs['source'] = source(fname)
+            h5.attrs['frame'] = frame
+            h5.attrs['projections'] = (start, end)
+        names.append(name)
+        log_lib.info("  *** frame %d: projections [%d, %d] of %s in %s" % (frame, start, end, fname, name))
+
+    return names
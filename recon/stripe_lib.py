@@ -0,0 +1,100 @@
+"""
+Stripe (ring) removal stages of the preprocessing chain.
+"""
+
+import functools
+
+import numpy as np
+import pywt
+import tomopy
+
+import pipeline_lib
+
+
+SINOGRAM_STAGES = ('fw', 'ti', 'sf')
+SLICE_STAGES = ('ring',)
+
+@functools.lru_cache(maxsize=None)
+def _wavelet(wname):
+    return pywt.Wavelet(wname)
+
+
+@functools.lru_cache(maxsize=64)
+def _damping(my, sigma):
+    # tomopy damping of the vertical band, moved to the unshifted FFT order
+    y_hat = (np.arange(-my, my, 2, dtype='float32') + 1) / 2
+    damp = -np.expm1(-np.square(y_hat) / (2 * np.square(sigma)))
+    return np.fft.ifftshift(damp)[:, np.newaxis]
+
+
+def _remove_stripe_fw(sino, level, wavelet, sigma, nx, xshift):
+    dx, dz = sino.shape
+    sli = np.zeros((nx, dz), dtype='float32')
+    sli[xshift:dx + xshift] = sino
+
+    # wavelet decomposition
+    bands = []
+    for n in range(level):
+        sli, (cH, cV, cD) = pywt.dwt2(sli, wavelet)
+        # damping of the ring artifact information of the vertical band
+        fcV = np.fft.fft(cV, axis=0)
+        fcV *= _damping(fcV.shape[0], sigma)
+        bands.append((cH, np.real(np.fft.ifft(fcV, axis=0)), cD))
+
+    # wavelet reconstruction
+    for cH, cV, cD in bands[::-1]:
+        sli = sli[0:cH.shape[0], 0:cH.shape[1]]
+        sli = pywt.idwt2((sli, (cH, cV, cD)), wavelet)
+
+    return sli[xshift:dx + xshift, 0:dz]
+
+
+def remove_stripe_fw(data, level=None, wname='db5', sigma=2, pad=True, ncore=None):
+    """
+    Remove stripes with the wavelet-FFT filter, as tomopy.remove_stripe_fw, in place.
+
+    Parameters
+    ----------
+    data : ndarray
+        float32 projections of shape (nproj, rows, columns).
+    level : int
+        Number of wavelet decomposition levels, None for log2 of the largest dimension.
+    wname : str
+        pywt wavelet name.
+    sigma : float
+        Damping parameter in Fourier space.
+    pad : bool
+        Extend the projection axis by 1/8 before filtering.
+    ncore : int
+        Number of threads.
+    """
+
+    data = np.asarray(data, dtype=np.float32)
+    dx = data.shape[0]
+    if level is None:
+        level = int(np.ceil(np.log2(np.max(data.shape))))
+    nx = dx + dx // 8 if pad else dx
+    xshift = int((nx - dx) // 2)
+    wavelet = _wavelet(wname)
+
+    def filter_sinogram(m):
+        data[:, m, :] = _remove_stripe_fw(data[:, m, :], level, wavelet, sigma, nx, xshift)
+
+    pipeline_lib.thread_map(filter_sinogram, [(m,) for m in range(data.shape[1])], ncore)
+
+    return data
+
+
+def remove_stripe_sf(data, size=5, ncore=None):
+    return tomopy.remove_stripe_sf(data, size=size, ncore=ncore)
+
+
+def remove_stripe_ti(data, alpha=1.5, ncore=None):
+    return tomopy.remove_stripe_ti(data, alpha=alpha, ncore=ncore)
+
+
+def remove_ring(rec, rwidth=30, ncore=None):
+    """
+    Ring removal on reconstructed slices (tomopy.remove_ring), the alternative to the sinogram filters.
+    """
+    return tomopy.remove_ring(rec, rwidth=rwidth, ncore=ncore)
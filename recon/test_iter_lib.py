@@ -0,0 +1,62 @@
+"""
+Stopping rule of the iterative methods: python -m pytest recon/test_iter_lib.py
+"""
+
+import numpy as np
+
+import fbp_lib
+import iter_lib
+
+
+def phantom(size):
+    y, x = np.mgrid[:size, :size] - (size - 1) / 2.0
+    img = np.zeros((size, size), dtype=np.float32)
+    img[x ** 2 + y ** 2 < (0.4 * size) ** 2] = 1
+    img[(x - 0.1 * size) ** 2 + (y + 0.05 * size) ** 2 < (0.1 * size) ** 2] = 2
+    img[(abs(x - 0.1 * size) < 0.05 * size) & (abs(y - 0.2 * size) < 0.02 * size)] = 3
+    return img
+
+
+def projections(size=64, nproj=24, noise=2.0):
+    # few noisy projections: the fbp start has negative streaks that the first SIRT iteration clips
+    theta = np.linspace(0, np.pi, nproj, endpoint=False)
+    projector = fbp_lib.Projector(theta, size, (size - 1) / 2.0, 1)
+    data = projector.forward(projector.from_slices(phantom(size)[np.newaxis])).transpose(0, 2, 1)
+    data = data + np.random.default_rng(0).normal(0, noise, data.shape).astype(np.float32)
+    return np.ascontiguousarray(data), theta
+
+
+def residual(data, theta, rec):
+    projector = fbp_lib.Projector(theta, data.shape[2], (data.shape[2] - 1) / 2.0, data.shape[1])
+    return np.linalg.norm(data.transpose(0, 2, 1) - projector.forward(projector.from_slices(rec)))
+
+
+def test_converged_only_on_a_small_decrease():
+    assert not iter_lib._converged([], 100.0, 1e-2)
+    assert not iter_lib._converged([125.3], 147.6, 1e-2)
+    assert not iter_lib._converged([125.3, 147.6], 124.0, 1e-2)
+    assert not iter_lib._converged([125.3, 147.6, 100.7], 90.1, 1e-2)
+    assert iter_lib._converged([100.0], 99.5, 1e-2)
+    assert iter_lib._converged([100.0], 0.0, 1e-2)
+
+
+def test_sirt_from_fbp_iterates_past_a_residual_increase():
+    data, theta = projections()
+    center = (data.shape[2] - 1) / 2.0
+    init = fbp_lib.recon(data, theta, center, filter_name='ramlak')
+
+    rec, niter = iter_lib.recon(data, theta, center, 'sirt', init.copy(), num_iter=200, tol=1e-2)
+
+    assert niter > 1
+    assert residual(data, theta, rec) < residual(data, theta, init)
+
+
+def test_cgls_from_fbp_lowers_the_residual():
+    data, theta = projections()
+    center = (data.shape[2] - 1) / 2.0
+    init = fbp_lib.recon(data, theta, center, filter_name='ramlak')
+
+    rec, niter = iter_lib.recon(data, theta, center, 'cgls', init.copy(), num_iter=200, tol=1e-2)
+
+    assert niter > 1
+    assert residual(data, theta, rec) < residual(data, theta, init)
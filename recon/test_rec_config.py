@@ -0,0 +1,36 @@
+"""
+recon options, recon.conf and per-user presets: python -m pytest recon/test_rec_config.py
+"""
+
+import argparse
+
+import rec_config
+
+
+PRESET = {'algorithm': 'sirtfbp', 'sample_detector_distance': 8, 'circ_mask': False}
+
+
+def parse(arg=(), config_name='missing.conf', preset=PRESET):
+    parser = argparse.ArgumentParser()
+    rec_config.Params(rec_config.RECON_PARAMS).add_arguments(parser)
+    return rec_config.parse_args(parser, arg, config_name, preset)
+
+
+def test_preset_survives_default_args():
+    args = parse()
+    assert args.algorithm == 'sirtfbp'
+    assert args.sample_detector_distance == 8
+    assert args.circ_mask is False
+    assert parse(preset=None).algorithm == 'gridrec'
+
+
+def test_config_and_command_line_override_the_preset(tmp_path):
+    config = tmp_path / 'recon.conf'
+    config.write_text('[reconstruction]\nmethod = fbp\n\n[phase-retrieval]\nsdd = 40\n')
+    args = parse(config_name=str(config))
+    assert args.algorithm == 'fbp'
+    assert args.sample_detector_distance == 40
+
+    args = parse(['--method=gridrec'], config_name=str(config))
+    assert args.algorithm == 'gridrec'
+    assert args.sample_detector_distance == 40
@@ -0,0 +1,59 @@
+"""
+Full reconstructions of a small simulated scan: python -m pytest recon/test_rec_lib.py
+"""
+
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+pytest.importorskip('tomopy')
+pytest.importorskip('dxchange')
+
+import fbp_lib
+import log_lib
+import rec_lib
+import writer_lib
+
+
+def scan(fname, nproj=90, rows=128, cols=64):
+    # spheres of different sizes along the rows, so that phase retrieval mixes the rows
+    z, y, x = np.mgrid[:rows, :cols, :cols].astype(np.float32)
+    obj = np.zeros((rows, cols, cols), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    for cz, cy, cx, r in zip(rng.uniform(0, rows, 24), rng.uniform(16, 48, 24), rng.uniform(16, 48, 24), rng.uniform(3, 10, 24)):
+        obj[(z - cz) ** 2 + (y - cy) ** 2 + (x - cx) ** 2 < r ** 2] += 0.01
+    theta = np.linspace(0, np.pi, nproj, endpoint=False)
+    projector = fbp_lib.Projector(theta, cols, (cols - 1) / 2.0, rows)
+    lines = projector.forward(projector.from_slices(obj))
+    os.makedirs(os.path.dirname(fname))
+    with h5py.File(fname, 'w') as h5:
+        h5['exchange/data'] = (4000 * np.exp(-lines.transpose(0, 2, 1))).astype(np.uint16)
+        h5['exchange/data_white'] = np.full((4, rows, cols), 4000, np.uint16)
+        h5['exchange/data_dark'] = np.zeros((2, rows, cols), np.uint16)
+        h5['exchange/theta'] = np.degrees(theta)
+    return fname
+
+
+def rec_full(tmp_path, name, **params):
+    fname = str(tmp_path / 'data' / 'proj_0001.h5')
+    if not os.path.exists(fname):
+        scan(fname)
+        log_lib.setup_logger(str(tmp_path / 'rec.log'))
+    variableDict = dict(rec_lib.variableDict, fname=fname, rec_dir=str(tmp_path / name), logs_home=str(tmp_path) + os.sep,
+                        rot_center=31.5, algorithm='fbp', stripe_methods=[], output='hdf5', **params)
+    rec_lib.rec_full(variableDict)
+    return h5py.File(str(tmp_path / name / 'proj_0001_full_rec.h5'), 'r')
+
+
+def test_phase_quantize_range_matches_a_full_pass(tmp_path):
+    with rec_full(tmp_path, 'uint16', phase=True, dtype='uint16') as h5:
+        vmin, vmax = h5['exchange/recon'].attrs['dtype_min'], h5['exchange/recon'].attrs['dtype_max']
+    with rec_full(tmp_path, 'float32', phase=True) as h5:
+        quantize = writer_lib.Quantizer('uint16')
+        quantize.add(h5['exchange/recon'][:])
+    full_min, full_max = quantize.fit()
+
+    assert abs(vmin - full_min) < 0.05 * (full_max - full_min)
+    assert abs(vmax - full_max) < 0.05 * (full_max - full_min)
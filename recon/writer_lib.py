@@ -0,0 +1,424 @@
+"""
+Background writers of reconstructed chunks.
+"""
+
+import os
+import time
+import threading
+import queue
+
+import h5py
+import dxchange
+import numpy as np
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+import log_lib
+import pipeline_lib
+
+
+# sentinel closing the writer queue
+_DONE = object()
+
+# lossless compressions of the HDF5 output; blosc and lz4 are HDF5 plugins loaded by hdf5plugin
+COMPRESSIONS = ('gzip', 'lzf', 'blosc', 'lz4')
+
+
+def compression_options(compression):
+    """
+    h5py create_dataset keywords of a lossless compression.
+
+    Parameters
+    ----------
+    compression : str
+        None or one of COMPRESSIONS.
+
+    Returns
+    -------
+    dict
+        Keywords of h5py create_dataset, gzip when the blosc/lz4 plugins are not installed.
+    """
+
+    if compression in ('blosc', 'lz4') and hdf5plugin is None:
+        log_lib.warning("  *** hdf5plugin is not installed, %s compression replaced by gzip" % compression)
+        compression = 'gzip'
+
+    if compression is None:
+        return {}
+    elif compression == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+    elif compression == 'lzf':
+        return {'compression': 'lzf', 'shuffle': True}
+    elif compression == 'blosc':
+        return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    elif compression == 'lz4':
+        return dict(hdf5plugin.LZ4())
+    raise ValueError("unknown compression %r, not one of %s" % (compression, ', '.join(COMPRESSIONS)))
+
+
+def _bin_plane(rec, f):
+    # average f x f pixel blocks of every slice
+    ny, nx = rec.shape[1] // f, rec.shape[2] // f
+    return rec[:, :ny * f, :nx * f].reshape(len(rec), ny, f, nx, f).mean(axis=(2, 4), dtype=np.float32)
+
+
+def _save_datasets(h5, datasets):
+    for name, data in datasets.items():
+        if name in h5:
+            del h5[name]
+        h5.create_dataset(name, data=data)
+
+
+def _fsync(fname):
+    fd = os.open(fname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Quantizer(object):
+    """
+    Linear conversion of float32 slices to uint8 or uint16, with a range set once by fit() from the slices passed to add().
+
+    Parameters
+    ----------
+    dtype : str
+        uint8 or uint16.
+    low, high : float
+        Percentiles mapped to 0 and to the largest integer.
+    step : int
+        Pixel subsampling of the slices passed to add().
+    """
+
+    def __init__(self, dtype, low=0.1, high=99.9, step=4):
+        self.dtype = np.dtype(dtype)
+        self.low = low
+        self.high = high
+        self.step = step
+        self.vmin = None
+        self.vmax = None
+        self._samples = []
+
+    def add(self, rec):
+        values = np.asarray(rec[:, ::self.step, ::self.step], dtype=np.float32).ravel()
+        # pixels zeroed by the circular mask are not part of the sample
+        self._samples.append(values[(values != 0) & np.isfinite(values)])
+
+    def fit(self):
+        """
+        Set and return the (vmin, vmax) range from the sampled values.
+        """
+        values = np.concatenate(self._samples) if self._samples else np.zeros(0)
+        if values.size == 0:
+            values = np.zeros(1, dtype=np.float32)
+        self.vmin, self.vmax = (float(v) for v in np.percentile(values, (self.low, self.high)))
+        self._samples = []
+        return self.vmin, self.vmax
+
+    def __call__(self, rec):
+        """
+        Convert a chunk, rec is overwritten when it is float32.
+        """
+        imax = np.iinfo(self.dtype).max
+        scale = imax / (self.vmax - self.vmin) if self.vmax > self.vmin else 0.0
+        rec = np.asarray(rec, dtype=np.float32)
+        rec -= self.vmin
+        rec *= scale
+        np.clip(rec, 0, imax, out=rec)
+        np.rint(rec, out=rec)
+        return rec.astype(self.dtype)
+
+
+class ChunkWriter(object):
+    """
+    Write (start, rec) chunks of slices from a background thread.
+
+    write() returns as soon as the chunk is queued and only blocks when depth chunks
+    are already waiting. The written files are flushed to disk (fsync) every
+    sync_every chunks and on close() rather than after every chunk.
+
+    Parameters
+    ----------
+    fname : str
+        Output file name (subclass specific).
+    depth : int
+        Number of chunks waiting to be written.
+    sync_every : int
+        Number of chunks written between two fsync.
+    quantize : callable
+        Conversion of each chunk before it is written, e.g. a Quantizer; it runs in the
+        writer thread.
+
+    Arrays given to add_dataset() are saved with the reconstructions on close().
+    """
+
+    def __init__(self, fname, depth=pipeline_lib.DEPTH, sync_every=8, quantize=None):
+        self.fname = fname
+        self.quantize = quantize
+        self.datasets = {}
+        self.sync_every = max(1, int(sync_every))
+        self.nbytes = 0
+        self.seconds = 0.0
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='rec-output')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, start, rec):
+        """
+        Queue the slices rec[0], rec[1], ... to be stored as slices start, start + 1, ...
+        """
+        self._check()
+        pipeline_lib.put(self._queue, (start, rec), self._thread.is_alive)
+        self._check()
+
+    def add_dataset(self, name, data):
+        """
+        Save data, e.g. per projection counts of the preprocessing, with the reconstructions
+        when the writer is closed: as dataset name of the HDF5 file, or as a text file
+        named after it next to the TIFF stack.
+        """
+        self.datasets[name] = data
+
+    def close(self):
+        """
+        Write the queued chunks, flush them to disk and log the write bandwidth.
+        """
+        pipeline_lib.put(self._queue, _DONE, self._thread.is_alive)
+        self._thread.join()
+        self._check()
+        if self.seconds > 0:
+            log_lib.info("  *** written %.2f GB in %.1f s (%.0f MB/s): %s" % (self.nbytes / 2.0**30, self.seconds, self.nbytes / 2.0**20 / self.seconds, self.fname))
+
+    def _run(self):
+        pending = 0
+        try:
+            while True:
+                entry = self._queue.get()
+                if entry is _DONE:
+                    break
+                start, rec = entry
+                if self.quantize is not None:
+                    rec = self.quantize(rec)
+                t0 = time.time()
+                self._write(start, rec)
+                pending += 1
+                if pending == self.sync_every:
+                    self._sync()
+                    pending = 0
+                self.seconds += time.time() - t0
+                self.nbytes += rec.nbytes
+                del entry, rec
+            t0 = time.time()
+            self._sync()
+            self.seconds += time.time() - t0
+        except Exception as error:
+            log_lib.error("  *** writer stopped: %s" % error)
+            self._error = error
+        finally:
+            self._close()
+
+    def _write(self, start, rec):
+        raise NotImplementedError
+
+    def _sync(self):
+        pass
+
+    def _close(self):
+        pass
+
+
+class TiffWriter(ChunkWriter):
+    """
+    Write the slices as fname_00000.tiff, fname_00001.tiff, ... with dxchange.write_tiff_stack.
+    """
+
+    def __init__(self, fname, **kwargs):
+        self._unsynced = []
+        super(TiffWriter, self).__init__(fname, **kwargs)
+
+    def _write(self, start, rec):
+        dxchange.write_tiff_stack(rec, fname=self.fname, start=start)
+        self._unsynced.extend('%s_%05d.tiff' % (self.fname, i) for i in range(start, start + len(rec)))
+
+    def _sync(self):
+        for fname in self._unsynced:
+            if os.path.exists(fname):
+                _fsync(fname)
+        self._unsynced = []
+
+    def _folder(self):
+        return os.path.dirname(self.fname)
+
+    def _close(self):
+        # the added datasets as text files next to the slices
+        folder = self._folder()
+        for name, data in self.datasets.items():
+            if folder != '' and not os.path.exists(folder):
+                os.makedirs(folder)
+            np.savetxt(os.path.join(folder, os.path.basename(name) + '.txt'), np.asarray(data), fmt='%s')
+
+
+class Hdf5Writer(ChunkWriter):
+    """
+    Write the slices into a single dataset of an HDF5 file, chunked one slice per chunk.
+
+    Multi-resolution levels are written next to it as dataset_1, dataset_2, ...: level k
+    averages blocks of 2**k slices and 2**k x 2**k pixels. Slices of a level that are
+    shared by several chunks are accumulated until all of them arrived, in any order.
+
+    Parameters
+    ----------
+    fname : str
+        HDF5 file name, overwritten.
+    nslices : int
+        Number of slices of the volume; the dataset grows if a chunk goes past it.
+    dataset : str
+        Dataset path.
+    compression : str
+        Lossless compression, None or one of COMPRESSIONS.
+    levels : int
+        Number of multi-resolution levels besides the full resolution.
+    attrs : dict
+        Attributes of the full resolution dataset, e.g. the reconstruction parameters.
+    """
+
+    def __init__(self, fname, nslices, dataset='/exchange/recon', compression=None, levels=0, attrs=None, **kwargs):
+        self.options = compression_options(compression)
+        dirname = os.path.dirname(fname)
+        if dirname != '' and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self._h5 = h5py.File(fname, 'w')
+        self._dsets = {}
+        self._pending = {}
+        self.nslices = nslices
+        self.dataset = dataset
+        self.levels = max(0, int(levels))
+        self.attrs = attrs or {}
+        super(Hdf5Writer, self).__init__(fname, **kwargs)
+
+    def _level(self, level, shape, dtype):
+        if level not in self._dsets:
+            name = self.dataset if level == 0 else '%s_%d' % (self.dataset, level)
+            f = 2 ** level
+            dset = self._h5.create_dataset(name, shape=(self.nslices // f,) + shape, maxshape=(None,) + shape, chunks=(1,) + shape, dtype=dtype, **self.options)
+            dset.attrs['binning'] = f
+            if level == 0:
+                for key, value in self.attrs.items():
+                    dset.attrs[key] = 'None' if value is None else value
+            self._dsets[level] = dset
+        return self._dsets[level]
+
+    def _write(self, start, rec):
+        dset = self._level(0, rec.shape[1:], rec.dtype)
+        if start + len(rec) > dset.shape[0]:
+            dset.resize(start + len(rec), axis=0)
+        dset[start:start + len(rec)] = rec
+
+        end = min(start + len(rec), self.nslices)
+        for level in range(1, self.levels + 1):
+            f = 2 ** level
+            plane = _bin_plane(rec[:end - start], f)
+            dset = self._level(level, plane.shape[1:], rec.dtype)
+            # only complete blocks of f slices belong to the level
+            for j in range(start // f, min(-(-end // f), self.nslices // f)):
+                lo, hi = max(j * f, start), min((j + 1) * f, end)
+                part = plane[lo - start:hi - start].sum(axis=0)
+                if hi - lo < f:
+                    total, count = self._pending.pop((level, j), (0, 0))
+                    part, count = part + total, count + hi - lo
+                    if count < f:
+                        self._pending[(level, j)] = (part, count)
+                        continue
+                part /= f
+                if dset.dtype.kind in 'ui':
+                    part = np.rint(part)
+                dset[j] = part.astype(dset.dtype)
+
+    def _sync(self):
+        self._h5.flush()
+        _fsync(self.fname)
+
+    def _close(self):
+        _save_datasets(self._h5, self.datasets)
+        self._h5.close()
+
+
+class FrameTiffWriter(TiffWriter):
+    """
+    Write the slices of the time frames of a dynamic scan as fname/frame_0000/recon_00000.tiff, ...
+
+    write() takes a (frame, start) key instead of start.
+    """
+
+    def _write(self, key, rec):
+        frame, start = key
+        fname = os.path.join(self.fname, 'frame_%04d' % frame, 'recon')
+        dxchange.write_tiff_stack(rec, fname=fname, start=start)
+        self._unsynced.extend('%s_%05d.tiff' % (fname, i) for i in range(start, start + len(rec)))
+
+    def _folder(self):
+        return self.fname
+
+
+class FrameHdf5Writer(ChunkWriter):
+    """
+    Write the slices of the time frames of a dynamic scan into a (frames, slices, rows, columns)
+    dataset of an HDF5 file, chunked one slice per chunk.
+
+    write() takes a (frame, start) key instead of start.
+
+    Parameters
+    ----------
+    fname : str
+        HDF5 file name, overwritten.
+    nframes, nslices : int
+        Number of frames and of slices per frame.
+    dataset, compression, attrs
+        As Hdf5Writer.
+    """
+
+    def __init__(self, fname, nframes, nslices, dataset='/exchange/recon', compression=None, attrs=None, **kwargs):
+        self.options = compression_options(compression)
+        dirname = os.path.dirname(fname)
+        if dirname != '' and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self._h5 = h5py.File(fname, 'w')
+        self._dset = None
+        self.nframes = nframes
+        self.nslices = nslices
+        self.dataset = dataset
+        self.attrs = attrs or {}
+        super(FrameHdf5Writer, self).__init__(fname, **kwargs)
+
+    def _write(self, key, rec):
+        frame, start = key
+        if self._dset is None:
+            shape = (self.nframes, self.nslices) + rec.shape[1:]
+            self._dset = self._h5.create_dataset(self.dataset, shape=shape, chunks=(1, 1) + rec.shape[1:], dtype=rec.dtype, **self.options)
+            for key, value in self.attrs.items():
+                self._dset.attrs[key] = 'None' if value is None else value
+        self._dset[frame, start:start + len(rec)] = rec
+
+    def _sync(self):
+        self._h5.flush()
+        _fsync(self.fname)
+
+    def _close(self):
+        _save_datasets(self._h5, self.datasets)
+        self._h5.close()